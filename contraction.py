@@ -0,0 +1,224 @@
+# -*- coding: utf-8 -*-
+# Contraction hierarchy over RoutingGraph, without qgis dependencies
+import heapq
+from math import inf
+import numpy as np
+
+
+class ContractionHierarchy:
+    # upward graph in CSR form: every edge goes from lower rank vertex to higher rank one,
+    # up_middles holds contracted vertex of a shortcut (-1 for original edges)
+    WITNESS_SETTLED_LIMIT = 200
+
+    def __init__(self, ranks, up_offsets, up_neighbours, up_costs, up_middles):
+        self.ranks = np.asarray(ranks, dtype=np.int32)
+        self.up_offsets = np.asarray(up_offsets, dtype=np.int32)
+        self.up_neighbours = np.asarray(up_neighbours, dtype=np.int32)
+        self.up_costs = np.asarray(up_costs, dtype=np.float32)
+        self.up_middles = np.asarray(up_middles, dtype=np.int32)
+        self._lists = None
+        self._middles = None
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        return cls(
+            arrays['ranks'],
+            arrays['up_offsets'],
+            arrays['up_neighbours'],
+            arrays['up_costs'],
+            arrays['up_middles'],
+            )
+
+    def to_arrays(self):
+        return {
+            'ranks': self.ranks,
+            'up_offsets': self.up_offsets,
+            'up_neighbours': self.up_neighbours,
+            'up_costs': self.up_costs,
+            'up_middles': self.up_middles,
+            }
+
+    ### PREPROCESSING ###
+
+    @classmethod
+    def build(cls, graph, feedback=None):
+        n = graph.vertex_count
+        # undirected adjacency {neighbour: (cost, middle)}, parallel edges collapsed to the cheapest
+        adjacency = [dict() for _ in range(n)]
+        costs = graph.edge_costs[:, 2].tolist()
+        for from_id, to_id, cost in zip(graph.edge_from.tolist(), graph.edge_to.tolist(), costs):
+            if from_id == to_id:
+                continue
+            if to_id not in adjacency[from_id] or cost < adjacency[from_id][to_id][0]:
+                adjacency[from_id][to_id] = (cost, -1)
+                adjacency[to_id][from_id] = (cost, -1)
+        contracted = bytearray(n)
+        contracted_neighbours = [0] * n
+        queue = [(cls.priority(adjacency, contracted, contracted_neighbours, v), v) for v in range(n)]
+        heapq.heapify(queue)
+        ranks = [0] * n
+        upward = [None] * n
+        rank = 0
+        while queue:
+            _, vertex_id = heapq.heappop(queue)
+            if contracted[vertex_id]:
+                continue
+            # lazy update - contract only if priority is still the smallest one
+            priority = cls.priority(adjacency, contracted, contracted_neighbours, vertex_id)
+            if queue and priority > queue[0][0]:
+                heapq.heappush(queue, (priority, vertex_id))
+                continue
+            for (u, w), (cost, _) in cls.find_shortcuts(adjacency, contracted, vertex_id).items():
+                if w not in adjacency[u] or cost < adjacency[u][w][0]:
+                    adjacency[u][w] = (cost, vertex_id)
+                    adjacency[w][u] = (cost, vertex_id)
+            contracted[vertex_id] = 1
+            ranks[vertex_id] = rank
+            rank += 1
+            upward[vertex_id] = adjacency[vertex_id]
+            for neighbour_id in adjacency[vertex_id]:
+                del adjacency[neighbour_id][vertex_id]
+                contracted_neighbours[neighbour_id] += 1
+            adjacency[vertex_id] = None
+            if feedback is not None and rank % 10000 == 0:
+                feedback.setProgress(int(rank / n * 100))
+        return cls.from_upward(ranks, upward)
+
+    @classmethod
+    def from_upward(cls, ranks, upward):
+        up_offsets = [0]
+        up_neighbours, up_costs, up_middles = [], [], []
+        for edges in upward:
+            for neighbour_id, (cost, middle) in (edges or {}).items():
+                up_neighbours.append(neighbour_id)
+                up_costs.append(cost)
+                up_middles.append(middle)
+            up_offsets.append(len(up_neighbours))
+        return cls(ranks, up_offsets, up_neighbours, up_costs, up_middles)
+
+    @classmethod
+    def priority(cls, adjacency, contracted, contracted_neighbours, vertex_id):
+        # edge difference plus contracted neighbours keeps the hierarchy uniform
+        shortcuts = len(cls.find_shortcuts(adjacency, contracted, vertex_id))
+        return shortcuts - len(adjacency[vertex_id]) + contracted_neighbours[vertex_id]
+
+    @classmethod
+    def find_shortcuts(cls, adjacency, contracted, vertex_id):
+        neighbours = adjacency[vertex_id]
+        shortcuts = {}
+        items = sorted(neighbours.items())
+        for i, (u, (cost_u, _)) in enumerate(items):
+            targets = {w: cost_u + cost_w for w, (cost_w, _) in items[i + 1:]}
+            if not targets:
+                continue
+            witness = cls.witness_search(adjacency, u, vertex_id, max(targets.values()))
+            for w, cost in targets.items():
+                if witness.get(w, inf) > cost:
+                    shortcuts[u, w] = (cost, vertex_id)
+        return shortcuts
+
+    @classmethod
+    def witness_search(cls, adjacency, start_vertex_id, skip_vertex_id, max_cost):
+        cost_so_far = {start_vertex_id: 0.0}
+        frontier = [(0.0, start_vertex_id)]
+        settled = set()
+        while frontier and len(settled) < cls.WITNESS_SETTLED_LIMIT:
+            cost, current = heapq.heappop(frontier)
+            if current in settled:
+                continue
+            if cost > max_cost:
+                break
+            settled.add(current)
+            for next_vertex_id, (edge_cost, _) in adjacency[current].items():
+                if next_vertex_id == skip_vertex_id:
+                    continue
+                new_cost = cost + edge_cost
+                if new_cost < cost_so_far.get(next_vertex_id, inf):
+                    cost_so_far[next_vertex_id] = new_cost
+                    heapq.heappush(frontier, (new_cost, next_vertex_id))
+        return cost_so_far
+
+    ### QUERY ###
+
+    def upward_lists(self):
+        if self._lists is None:
+            self._lists = (
+                self.up_offsets.tolist(),
+                self.up_neighbours.tolist(),
+                self.up_costs.tolist(),
+                )
+        return self._lists
+
+    def middle_between(self, from_vertex_id, to_vertex_id):
+        if self._middles is None:
+            self._middles = {}
+            offsets, neighbours, _ = self.upward_lists()
+            middles = self.up_middles.tolist()
+            for vertex_id in range(len(offsets) - 1):
+                for slot in range(offsets[vertex_id], offsets[vertex_id + 1]):
+                    self._middles[vertex_id, neighbours[slot]] = middles[slot]
+        if (from_vertex_id, to_vertex_id) in self._middles:
+            return self._middles[from_vertex_id, to_vertex_id]
+        return self._middles[to_vertex_id, from_vertex_id]
+
+    def query(self, start_vertex_id, finish_vertex_id):
+        # returns (original vertex ids from finish to start or None, expanded vertex count)
+        if start_vertex_id == finish_vertex_id:
+            return [start_vertex_id], 0
+        offsets, neighbours, costs = self.upward_lists()
+        cost_so_far = ({start_vertex_id: 0.0}, {finish_vertex_id: 0.0})
+        came_from = ({start_vertex_id: -1}, {finish_vertex_id: -1})
+        frontiers = ([(0.0, start_vertex_id)], [(0.0, finish_vertex_id)])
+        settled = (set(), set())
+        best_cost = inf
+        meeting_vertex_id = -1
+        expanded = 0
+        while frontiers[0] or frontiers[1]:
+            side = 0 if frontiers[0] and (not frontiers[1] or frontiers[0][0][0] <= frontiers[1][0][0]) else 1
+            cost, current = heapq.heappop(frontiers[side])
+            if current in settled[side]:
+                continue
+            if cost >= best_cost:
+                # this side can not improve the best path anymore
+                frontiers[side].clear()
+                continue
+            settled[side].add(current)
+            expanded += 1
+            other_cost = cost_so_far[1 - side].get(current, inf)
+            if cost + other_cost < best_cost:
+                best_cost = cost + other_cost
+                meeting_vertex_id = current
+            for slot in range(offsets[current], offsets[current + 1]):
+                next_vertex_id = neighbours[slot]
+                new_cost = cost + costs[slot]
+                if new_cost < cost_so_far[side].get(next_vertex_id, inf):
+                    cost_so_far[side][next_vertex_id] = new_cost
+                    came_from[side][next_vertex_id] = current
+                    heapq.heappush(frontiers[side], (new_cost, next_vertex_id))
+        if meeting_vertex_id == -1:
+            return None, expanded
+        to_start = self.unpack_chain(came_from[0], meeting_vertex_id)
+        to_finish = self.unpack_chain(came_from[1], meeting_vertex_id)
+        return to_finish[::-1] + to_start[1:], expanded
+
+    def unpack_chain(self, came_from, vertex_id):
+        # vertex ids from vertex_id back to search root with all shortcuts unpacked
+        result = [vertex_id]
+        pointer = vertex_id
+        while came_from[pointer] != -1:
+            result += self.unpack_edge(pointer, came_from[pointer])[1:]
+            pointer = came_from[pointer]
+        return result
+
+    def unpack_edge(self, from_vertex_id, to_vertex_id):
+        result = [from_vertex_id]
+        stack = [(from_vertex_id, to_vertex_id)]
+        while stack:
+            u, w = stack.pop()
+            middle = self.middle_between(u, w)
+            if middle == -1:
+                result.append(w)
+            else:
+                stack.append((middle, w))
+                stack.append((u, middle))
+        return result
@@ -21,9 +21,11 @@ from qgis.core import (
     QgsProject,
     QgsFeature,
     QgsProcessingParameterVectorLayer,
+    QgsProcessingParameterEnum,
     )
 from qgis.PyQt.QtCore import QVariant
 from VeloRouteScripts.distance_framework import DistanceCalculateFramework
+from VeloRouteScripts.elevation import ElevationSampler
 from VeloRouteScripts import utils
 
 
@@ -42,6 +44,17 @@ class DistanceCalculateAlgorithm(QgsProcessingAlgorithm):
     POIS_INPUT = 'POIS_INPUT'
     HEIGHTS_INPUT = 'HEIGHTS_INPUT'
     TOLERANCE = 'TOLERANCE'
+    HEIGHTS_INTERPOLATION = 'HEIGHTS_INTERPOLATION'
+    USE_GRAPH_CACHE = 'USE_GRAPH_CACHE'
+    PATH_CACHE_SIZE = 'PATH_CACHE_SIZE'
+    PATH_CACHE_SYMMETRIC = 'PATH_CACHE_SYMMETRIC'
+    WORKERS = 'WORKERS'
+    SEARCH_MODE = 'SEARCH_MODE'
+    LANDMARK_COUNT = 'LANDMARK_COUNT'
+    OUTPUT_CHUNK_SIZE = 'OUTPUT_CHUNK_SIZE'
+    OUTPUT_PRECISION = 'OUTPUT_PRECISION'
+    INCREMENTAL = 'INCREMENTAL'
+    SERVICE_RADIUS = 'SERVICE_RADIUS'
 
     def initAlgorithm(self, config):
         main_route_layer = utils.get_main_road_layer()
@@ -99,6 +112,53 @@ class DistanceCalculateAlgorithm(QgsProcessingAlgorithm):
                                                    self.tr('Topology tolerance'),
                                                    QgsProcessingParameterNumber.Double,
                                                    0.0, False, 0, 99999999.99))
+        advanced_params.append(QgsProcessingParameterEnum(self.HEIGHTS_INTERPOLATION,
+                                                   self.tr('Интерполяция высот'),
+                                                   options=[self.tr('Ближайший пиксель'), self.tr('Билинейная')],
+                                                   defaultValue=0))
+        advanced_params.append(QgsProcessingParameterBoolean(self.USE_GRAPH_CACHE,
+                                                   self.tr('Кэшировать граф дорог в папке проекта'),
+                                                   defaultValue=True))
+        advanced_params.append(QgsProcessingParameterNumber(self.PATH_CACHE_SIZE,
+                                                   self.tr('Размер кэша путей (0 - без кэша)'),
+                                                   QgsProcessingParameterNumber.Integer,
+                                                   10000, False, 0))
+        advanced_params.append(QgsProcessingParameterBoolean(self.PATH_CACHE_SYMMETRIC,
+                                                   self.tr('Использовать обратные пути из кэша'),
+                                                   defaultValue=True))
+        advanced_params.append(QgsProcessingParameterNumber(self.WORKERS,
+                                                   self.tr('Количество процессов расчета (0 - последовательно)'),
+                                                   QgsProcessingParameterNumber.Integer,
+                                                   0, False, 0, 64))
+        advanced_params.append(QgsProcessingParameterEnum(self.SEARCH_MODE,
+                                                   self.tr('Алгоритм поиска путей'),
+                                                   options=[
+                                                       self.tr('Один обход сети от носителя до всех целей'), 
+                                                       self.tr('A* с ориентирами (ALT)'), 
+                                                       self.tr('Двунаправленный ALT'),
+                                                       self.tr('Иерархия сжатия (CH)'),
+                                                       self.tr('A* по прямой с учетом высот'),
+                                                       ],
+                                                   defaultValue=0))
+        advanced_params.append(QgsProcessingParameterNumber(self.LANDMARK_COUNT,
+                                                   self.tr('Количество ориентиров ALT'),
+                                                   QgsProcessingParameterNumber.Integer,
+                                                   8, False, 1, 64))
+        advanced_params.append(QgsProcessingParameterNumber(self.OUTPUT_CHUNK_SIZE,
+                                                   self.tr('Размер пакета записи путей'),
+                                                   QgsProcessingParameterNumber.Integer,
+                                                   1000, False, 1))
+        advanced_params.append(QgsProcessingParameterNumber(self.OUTPUT_PRECISION,
+                                                   self.tr('Точность координат путей, знаков (-1 - без округления)'),
+                                                   QgsProcessingParameterNumber.Integer,
+                                                   -1, False, -1, 15))
+        advanced_params.append(QgsProcessingParameterBoolean(self.INCREMENTAL,
+                                                   self.tr('Пересчитывать только измененные направления'),
+                                                   defaultValue=False))
+        advanced_params.append(QgsProcessingParameterNumber(self.SERVICE_RADIUS,
+                                                   self.tr('Максимальное расстояние между сервисами, м'),
+                                                   QgsProcessingParameterNumber.Double,
+                                                   DistanceCalculateFramework.SERVICE_RADIUS, False, 0))
         for p in advanced_params:
             p.setFlags(p.flags() | QgsProcessingParameterDefinition.FlagAdvanced)
             self.addParameter(p)
@@ -112,6 +172,17 @@ class DistanceCalculateAlgorithm(QgsProcessingAlgorithm):
         poi_layers = self.parameterAsLayerList(parameters, self.POIS_INPUT, context)
         height_layer = self.parameterAsRasterLayer(parameters, self.HEIGHTS_INPUT, context)
         tolerance = self.parameterAsDouble(parameters, self.TOLERANCE, context)
+        height_interpolation = ElevationSampler.METHODS[self.parameterAsEnum(parameters, self.HEIGHTS_INTERPOLATION, context)]
+        use_graph_cache = self.parameterAsBool(parameters, self.USE_GRAPH_CACHE, context)
+        path_cache_size = self.parameterAsInt(parameters, self.PATH_CACHE_SIZE, context)
+        path_cache_symmetric = self.parameterAsBool(parameters, self.PATH_CACHE_SYMMETRIC, context)
+        workers = self.parameterAsInt(parameters, self.WORKERS, context)
+        search_mode = DistanceCalculateFramework.SEARCH_MODES[self.parameterAsEnum(parameters, self.SEARCH_MODE, context)]
+        landmark_count = self.parameterAsInt(parameters, self.LANDMARK_COUNT, context)
+        output_chunk_size = self.parameterAsInt(parameters, self.OUTPUT_CHUNK_SIZE, context)
+        output_precision = self.parameterAsInt(parameters, self.OUTPUT_PRECISION, context)
+        incremental = self.parameterAsBool(parameters, self.INCREMENTAL, context)
+        service_radius = self.parameterAsDouble(parameters, self.SERVICE_RADIUS, context)
         
         framework = DistanceCalculateFramework(
             sign_layer, 
@@ -120,15 +191,30 @@ class DistanceCalculateAlgorithm(QgsProcessingAlgorithm):
             secondary_road_layer, 
             height_layer, 
             tolerance,
-            feedback
+            feedback,
+            height_interpolation,
+            use_graph_cache,
+            path_cache_size,
+            path_cache_symmetric,
+            workers,
+            search_mode,
+            landmark_count,
+            incremental,
+            service_radius,
             )
         
         path_sink, path_dest_id = self.parameterAsSink(parameters, self.PATHS_OUTPUT,
                 context, framework.output_fields, QgsWkbTypes.LineString, framework.TARGET_CRS)
         
-        for i, path_feature in enumerate(framework.main()):
-            path_feature['id'] = i
-            path_sink.addFeature(path_feature, QgsFeatureSink.FastInsert)
+        path_writer = utils.ChunkedSinkWriter(
+            path_sink, 
+            output_chunk_size, 
+            output_precision if output_precision >= 0 else None,
+            )
+        for path_feature in framework.main():
+            path_writer.add(path_feature)
+        # buffered tail is written only after a successful run, an error of main() is not masked by the sink
+        path_writer.close()
         return {self.PATHS_OUTPUT: path_dest_id}
         
     
@@ -165,10 +251,36 @@ class DistanceCalculateAlgorithm(QgsProcessingAlgorithm):
                 "соответствует высоте рельефа от уровня моря (с сайта USGS Earthexplorer, алгоритм mean)</li>"\
                 "<li><b>Topology tolerance</b> - степень “сшивания” дорожной сети. Если все "\
                 "сопряжения всех участков лежат точно на полилиниях, то значения оставить как 0</li>"\
+                "<li><b>Интерполяция высот</b> - способ получения высоты вершины сети из растра: "\
+                "значение ближайшего пикселя или билинейная интерполяция по четырем соседним</li>"\
+                "<li><b>Кэшировать граф дорог</b> - построенная сеть сохраняется в папку .velo_cache проекта "\
+                "и используется повторно, пока не изменились дороги, допуск, носители или объекты</li>"\
+                "<li><b>Размер кэша путей</b> - сколько последних рассчитанных путей хранить в памяти "\
+                "для повторного использования; обратные пути можно брать из кэша, так как сеть ненаправленная</li>"\
+                "<li><b>Количество процессов расчета</b> - если больше 1, пути от носителей считаются параллельно "\
+                "в отдельных процессах, порядок нумерации носителей не меняется</li>"\
+                "<li><b>Алгоритм поиска путей</b> - по умолчанию от каждого носителя выполняется один обход сети "\
+                "до всех его целей (только в этом режиме работают параллельные процессы). ALT считает каждый путь "\
+                "носитель-цель отдельным запросом A*: заранее считаются расстояния до нескольких ориентиров сети, "\
+                "что точнее оценивает остаток пути; иерархия сжатия один раз строится для сети "\
+                "и сохраняется в кэш проекта, после чего запросы почти не раскрывают вершин. "\
+                "A* по прямой с учетом высот - прежняя оценка остатка пути, для сравнения с ALT и CH. "\
+                "В режимах с отдельными запросами используется кэш путей. Во всех режимах число запросов "\
+                "и раскрытых вершин пишется в лог</li>"\
+                "<li><b>Размер пакета записи путей</b> и <b>Точность координат путей</b> - пути пишутся в итоговый слой "\
+                "пакетами заданного размера; при заданной точности координаты округляются, а повторяющиеся вершины удаляются</li>"\
+                "<li><b>Пересчитывать только измененные направления</b> - входные данные и результаты каждого направления "\
+                "сохраняются в кэш проекта; при повторном запуске пересчитываются только направления, у которых изменился "\
+                "носитель, названия целей или объекты, либо путь мог измениться из-за правок дорог. Для остальных "\
+                "значения km_* не меняются, а пути берутся из сохраненных</li>"\
+                "<li><b>Максимальное расстояние между сервисами</b> - сервисы одного направления должны стоять "\
+                "не дальше этого расстояния друг от друга, иначе в km пишется N/A. Группы близких объектов "\
+                "строятся один раз при запуске</li>"\
                 "</ul>"\
                 "<b>Результат</b><ul>"\
                 "<li>Будет создан слой с линиями кратчайших путей. Он поможет отслеживать "\
-                "корректность работы алгоритма, а также посмотреть рассчитанные длины путей (2d - без учета рельефа, 3d - с учетом)</li>"\
+                "корректность работы алгоритма, а также посмотреть рассчитанные длины путей (2d - без учета рельефа, 3d - с учетом). "\
+                "Если носитель стоит в точке объекта, путь записывается с нулевой длиной и без геометрии</li>"\
                 "<li>В аттрибутивке слоя носителей обновятся значения для параметров типа: "\
                 "PIC, km, NameEn, а так же присвоен код ближайшего участка</li>"\
                 "</ul>"
\ No newline at end of file
@@ -2,20 +2,17 @@
 
 from VeloRouteScripts import utils
 from qgis.core import (
-    QgsProject,
-    QgsCoordinateTransform,
     QgsCoordinateReferenceSystem,
     QgsPointXY,
     QgsDistanceArea,
-    QgsLineString,
     QgsVectorLayer,
     QgsFeature,
     QgsSpatialIndex,
     QgsGeometry,
-    QgsRaster,
     QgsFields,
     QgsFeatureRequest,
     QgsField,
+    QgsRectangle,
     NULL    
     )
 from qgis.analysis import (
@@ -24,28 +21,46 @@ from qgis.analysis import (
     QgsNetworkDistanceStrategy,
     )
 from qgis.PyQt.QtCore import QVariant
-from queue import PriorityQueue
-from itertools import chain, product, combinations
+from itertools import product, combinations, repeat
 from .utils import *
+from .elevation import ElevationSampler
+from .contraction import ContractionHierarchy
+from .distance_manifest import DistanceManifest, DirectionRecord, make_direction_key
+from .routing import (
+    EARTH_RADIUS_LOWER_BOUND,
+    RoutingGraph, 
+    GraphCache, 
+    PathCache, 
+    graph_cache_key, 
+    edge_keys,
+    SegmentGrid,
+    astar, 
+    bidirectional_astar,
+    spherical_heuristic,
+    Landmarks,
+    sign_paths,
+    distance_row,
+    init_search_worker,
+    search_sign_paths,
+    search_distance_row,
+    )
 from math import hypot
+from pathlib import Path
+import multiprocessing
+import os
+import tempfile
+import shutil
+import numpy as np
 
 
-class DistanceCalculateFramework:
-    NAMERU_FIELD_NAME = 'NameRU'
-    PIC_FIELD_NAME = 'PIC'
-    NAMEEN_FIELD_NAME = 'NameEN'
-    KM_FIELD_NAME = 'km'    
-    SIGN_ROUTECODE_FIELD_NAME = 'routcode'
-    SIGN_NUM_FIELD_NAME = 'Num'
-    ROAD_ROUTECODE_FIELD_NAME = 'CODE'
-    
+class RoutingGraphFramework:
+    # routing graph of the road layers with tied sign and POI points, shared by the distance frameworks
+    LOGGER_NAME = 'Distance Framework'
+
     TARGET_CRS = QgsCoordinateReferenceSystem("EPSG:4326")
     DISTANCE_CALCULATOR = QgsDistanceArea()
     DISTANCE_CALCULATOR.setEllipsoid('WGS84')
-    
-    NAV = 'N/A'
-    ERRORV = 'Ошибка?'
-    
+
     def __init__(
             self, 
             sign_layer, 
@@ -55,36 +70,112 @@ class DistanceCalculateFramework:
             height_map, 
             graph_tolerance, 
             feedback,
+            height_interpolation=ElevationSampler.NEAREST,
+            use_graph_cache=True,
+            workers=0,
             ):
-        self.logger = FeedbackLogger('Distance Framework', feedback)
+        self.logger = FeedbackLogger(self.LOGGER_NAME, feedback)
         self.feedback = feedback
+        reset_caches()
         self.sign_layer = sign_layer
         self.poi_layers = poi_layers
         self.main_roads_layer = main_roads_layer
         self.secondary_roads_layer = secondary_roads_layer
         self.graph_tolerance = graph_tolerance
-        self.height_provider = height_map.dataProvider() if height_map else None
-        self.main_road_spatial = QgsSpatialIndex(self.main_roads_layer.getFeatures())
-        self.init_output_fields()
+        self.height_map = height_map
+        self.height_interpolation = height_interpolation
+        self.graph_cache = self.get_graph_cache() if use_graph_cache else None
+        self.workers = workers
+        self.graph_folder = None
+        self.temp_graph_folder = None
         self.build_graph()
-        self.current_direction = None
-    
-    def init_output_fields(self):
-        self.output_fields = QgsFields()
-        self.output_fields.append(QgsField('id', QVariant.Int))
-        self.output_fields.append(QgsField('length_2d', QVariant.Double))
-        self.output_fields.append(QgsField('length_3d', QVariant.Double))
-        self.output_fields.append(QgsField('direction', QVariant.String))
+
+    def get_graph_cache(self):
+        return utils.get_project_cache()
     
     def build_graph(self):
-        # collect all points and transform them
+        # collect all points with their feature ids and transform them
+        point_layers = [self.sign_layer] + self.poi_layers
+        point_features = []
         additional_points = []
-        for layer in [self.sign_layer] + self.poi_layers:
+        for layer_index, layer in enumerate(point_layers):
+            for feature_id, pt in get_layer_points(layer, self.TARGET_CRS).items():
+                point_features.append((layer_index, feature_id))
+                additional_points.append((pt.x(), pt.y()))
+        point_coords = np.array(additional_points, dtype=np.float64).reshape(-1, 2)
+        point_features = np.array(point_features, dtype=np.int64).reshape(-1, 2)
+        road_key = self.road_cache_key()
+        tied_key = graph_cache_key(
+            road_key, 
+            point_coords.tobytes(), 
+            point_features.tobytes(), 
+            '|'.join(i.id() for i in point_layers).encode(), 
+            self.height_cache_key(),
+            )
+        self.graph_key = tied_key
+        arrays = self.graph_cache.load('tied', tied_key) if self.graph_cache else None
+        if arrays is None:
+            arrays = self.graph_cache.load('roads', road_key) if self.graph_cache else None
+            if arrays is None:
+                arrays = self.build_road_graph()
+                if self.graph_cache:
+                    self.save_to_cache('roads', road_key, arrays)
+            else:
+                self.logger.log_info('Road graph loaded from cache')
+            arrays = self.tie_points(arrays, point_coords)
+            arrays.update(self.make_routing_graph(arrays).to_arrays())
+            if self.graph_cache:
+                self.graph_folder = self.save_to_cache('tied', tied_key, arrays)
+        else:
+            self.graph_folder = self.graph_cache.entry_folder('tied', tied_key)
+            self.logger.log_info('Routing graph loaded from cache')
+        self.graph = RoutingGraph.from_arrays(arrays)
+        self.edge_keys = np.asarray(arrays['edge_keys'])
+        # (layer id, feature id) -> vertex id, points are never searched by coordinates
+        self.feature_vertex_ids = {}
+        for (layer_index, feature_id), vertex_id in zip(point_features.tolist(), arrays['point_vertex_ids'].tolist()):
+            self.feature_vertex_ids[point_layers[layer_index].id(), feature_id] = vertex_id
+        self.logger.log_info(f'Routing graph: {self.graph.vertex_count} vertices, {self.graph.edge_count} edges')
+
+    def save_to_cache(self, kind, key, arrays):
+        folder = self.graph_cache.save(kind, key, arrays)
+        if folder is None:
+            self.logger.log_error(f'Graph cache not saved: {self.graph_cache.error}')
+        return folder
+
+    def road_cache_key(self):
+        parts = [str(self.graph_tolerance).encode()]
+        for layer in self.get_road_layers():
+            parts.append(layer.sourceCrs().toWkt().encode())
             for feature in layer.getFeatures():
-                geom = xform_geometry_4326(feature.geometry(), layer.sourceCrs())
-                additional_points.append(geom.asPoint())
-        # build graph
-        paths = self.merge_linestring_layers(self.main_roads_layer, self.secondary_roads_layer)
+                parts.append(str(feature.id()).encode())
+                parts.append(bytes(feature.geometry().asWkb()))
+        return graph_cache_key(*parts)
+
+    def height_cache_key(self):
+        if not self.height_map:
+            return b''
+        # a dem rewritten at the same path keeps its source, so file stats and raster geometry are keyed too
+        source = self.height_map.source()
+        path = source.split('|')[0]
+        file_stats = ''
+        if os.path.isfile(path):
+            stat = os.stat(path)
+            file_stats = f'{stat.st_size}|{stat.st_mtime_ns}'
+        return '|'.join((
+            source,
+            str(self.height_interpolation),
+            file_stats,
+            self.height_map.extent().toString(),
+            f'{self.height_map.width()}x{self.height_map.height()}',
+            self.height_map.crs().authid(),
+            )).encode()
+
+    def get_road_layers(self):
+        return [i for i in (self.main_roads_layer, self.secondary_roads_layer) if i is not None]
+
+    def build_road_graph(self):
+        paths = self.merge_linestring_layers(*self.get_road_layers())
         director = QgsVectorLayerDirector(
             paths, 
             directionFieldId = -1, 
@@ -95,92 +186,142 @@ class DistanceCalculateFramework:
         )
         director.addStrategy(QgsNetworkDistanceStrategy())
         builder = QgsGraphBuilder(self.TARGET_CRS, True, self.graph_tolerance)
-        tied_points_list = director.makeGraph(builder, additional_points, self.feedback)
+        director.makeGraph(builder, [], self.feedback)
         self.logger.log_info('Graph init...')
-        self.network = builder.graph()
-        # make tied edges
-        for add_pt, tied_pt in zip(additional_points, tied_points_list):
-            add_id = self.network.addVertex(add_pt)
-            tied_id = self.network.findVertex(tied_pt)
-            self.network.addEdge(add_id, tied_id, [QgsNetworkDistanceStrategy()])
+        network = builder.graph()
+        arrays = self.export_graph(network)
+        # QgsGraph is not needed anymore, search runs on the exported arrays
+        del network, builder, director, paths
         self.logger.log_info('Graph builded')
+        return arrays
+
+    def export_graph(self, network):
+        self.logger.log_info('Graph export...')
+        coords = np.empty((network.vertexCount(), 2), dtype=np.float64)
+        for vertex_id in range(network.vertexCount()):
+            pt = network.vertex(vertex_id).point()
+            coords[vertex_id] = pt.x(), pt.y()
+        # director makes edges for both directions, network is undirected
+        pairs = set()
+        for edge_id in range(network.edgeCount()):
+            edge = network.edge(edge_id)
+            from_id, to_id = edge.fromVertex(), edge.toVertex()
+            if from_id != to_id:
+                pairs.add((min(from_id, to_id), max(from_id, to_id)))
+        pairs = np.array(sorted(pairs), dtype=np.int32).reshape(-1, 2)
+        lengths = self.calc_edge_lengths(coords, pairs[:, 0], pairs[:, 1])
+        return {
+            'coords': coords,
+            'edge_from': pairs[:, 0],
+            'edge_to': pairs[:, 1],
+            'edge_lengths': lengths,
+            }
+
+    def tie_points(self, arrays, point_coords):
+        # connect every distinct point to the projection on its nearest edge, edge is splitted there
+        self.logger.log_info('Tie points...')
+        coords = arrays['coords']
+        edge_from = arrays['edge_from']
+        edge_to = arrays['edge_to']
+        unique_coords, inverse = np.unique(point_coords, axis=0, return_inverse=True)
+        grid = SegmentGrid(coords, edge_from, edge_to)
+        nearest_edges, nearest_ts, _ = grid.nearest(unique_coords[:, 0].tolist(), unique_coords[:, 1].tolist())
+        projections = list(zip(nearest_edges.tolist(), nearest_ts.tolist()))
+        splits = {}
+        for edge_id, t in projections:
+            if edge_id != -1:
+                splits.setdefault(edge_id, set()).add(t)
+        # split edges
+        new_coords = [coords]
+        new_from, new_to, new_keys = [], [], []
+        road_keys = edge_keys(coords, edge_from, edge_to)
+        split_vertex = {}
+        vertex_count = len(coords)
+        for edge_id, ts in splits.items():
+            from_id, to_id = int(edge_from[edge_id]), int(edge_to[edge_id])
+            chain = [from_id]
+            for t in sorted(ts):
+                if t <= 0:
+                    split_vertex[edge_id, t] = from_id
+                elif t >= 1:
+                    split_vertex[edge_id, t] = to_id
+                else:
+                    new_coords.append(coords[from_id] + (coords[to_id] - coords[from_id]) * t)
+                    split_vertex[edge_id, t] = vertex_count
+                    chain.append(vertex_count)
+                    vertex_count += 1
+            chain.append(to_id)
+            new_from += chain[:-1]
+            new_to += chain[1:]
+            new_keys += [int(road_keys[edge_id])] * (len(chain) - 1)
+        # points vertices and tie edges, points with equal coordinates share the vertex
+        unique_vertex_ids = np.full(len(unique_coords), -1, dtype=np.int32)
+        for i, projection in enumerate(projections):
+            if projection[0] == -1:
+                continue
+            new_coords.append(unique_coords[i])
+            unique_vertex_ids[i] = vertex_count
+            new_from.append(vertex_count)
+            new_to.append(split_vertex[projection])
+            new_keys.append(-1)
+            vertex_count += 1
+        keep = np.ones(len(edge_from), dtype=bool)
+        keep[list(splits.keys())] = False
+        coords = np.vstack([np.asarray(i, dtype=np.float64).reshape(-1, 2) for i in new_coords])
+        new_from = np.array(new_from, dtype=np.int32)
+        new_to = np.array(new_to, dtype=np.int32)
+        self.logger.log_info(f'Points tied: {len(unique_coords)} distinct points on {len(splits)} edges')
+        return {
+            'coords': coords,
+            'edge_from': np.concatenate([edge_from[keep], new_from]),
+            'edge_to': np.concatenate([edge_to[keep], new_to]),
+            'edge_lengths': np.concatenate([
+                arrays['edge_lengths'][keep], 
+                self.calc_edge_lengths(coords, new_from, new_to),
+                ]),
+            # road edge every edge was splitted from, -1 for tie edges
+            'edge_keys': np.concatenate([road_keys[keep], np.array(new_keys, dtype=np.int64)]),
+            'point_vertex_ids': unique_vertex_ids[inverse.reshape(-1)],
+            }
+
+    def make_routing_graph(self, arrays):
+        coords = arrays['coords']
+        elevations = self.sample_vertex_elevations(coords)
+        lengths = arrays['edge_lengths']
+        heights = np.abs(elevations[arrays['edge_from']] - elevations[arrays['edge_to']])
+        edge_costs = np.column_stack([lengths, heights, np.hypot(lengths, heights)])
+        return RoutingGraph(coords, arrays['edge_from'], arrays['edge_to'], edge_costs, elevations)
+
+    def calc_edge_lengths(self, coords, edge_from, edge_to):
+        lengths = np.empty(len(edge_from), dtype=np.float64)
+        for edge_id, (from_id, to_id) in enumerate(zip(edge_from.tolist(), edge_to.tolist())):
+            lengths[edge_id] = self.DISTANCE_CALCULATOR.measureLine(
+                QgsPointXY(*coords[from_id]), 
+                QgsPointXY(*coords[to_id]),
+                )
+        return lengths
+
+    def sample_vertex_elevations(self, coords):
+        if not self.height_map:
+            return np.zeros(len(coords))
+        xmin, ymin = coords.min(axis=0)
+        xmax, ymax = coords.max(axis=0)
+        sampler = ElevationSampler(
+            self.height_map, 
+            extent=QgsRectangle(xmin, ymin, xmax, ymax), 
+            extent_crs=self.TARGET_CRS, 
+            method=self.height_interpolation,
+            )
+        return sampler.sample_points(coords, self.TARGET_CRS)
+
+    def find_vertex(self, layer, feature_id):
+        return self.feature_vertex_ids.get((layer.id(), feature_id), -1)
 
-    def calc_vertex_distance(self, from_vertex_id: int, to_vertex_id: int):
-        pt1 = self.network.vertex(from_vertex_id).point()
-        pt2 = self.network.vertex(to_vertex_id).point()
-        l = self.DISTANCE_CALCULATOR.measureLine(pt1, pt2)
-        h = abs(self.get_elevation_at_point(pt1) - self.get_elevation_at_point(pt2))
-        return hypot(l,h)
-    
-    def iter_vertex_edges(self, vertex_id):
-        vertex = self.network.vertex(vertex_id)
-        for iedge in vertex.incomingEdges():
-            yield self.network.edge(iedge)    
-        for iedge in vertex.outgoingEdges():
-            yield self.network.edge(iedge)     
-            
-    def edge_cost(self, edge):
-        return self.calc_vertex_distance(edge.fromVertex(), edge.toVertex())
-    
-    def get_elevation_at_point(self, pt):
-        if self.height_provider:
-            res = self.height_provider.identify(pt, QgsRaster.IdentifyFormatValue)
-            if res:
-                return res.results()[1]
-        return 0
-
-    def shortest_path(self, from_geometry: QgsPointXY, to_geometry: QgsPointXY):
-        start_vertex_id = self.network.findVertex(from_geometry)
-        finish_vertex_id = self.network.findVertex(to_geometry)
-        if start_vertex_id == -1:
-            raise Exception('Cant find start point on graph')
-        if finish_vertex_id == -1:
-            raise Exception('Cant find finish point on graph')
-        print(start_vertex_id, finish_vertex_id)
-        # init
-        frontier = PriorityQueue()
-        frontier.put((0, start_vertex_id))
-        came_from = dict()
-        cost_so_far = dict()
-        came_from[start_vertex_id] = None
-        cost_so_far[start_vertex_id] = 0
-        # searching (A* algorithm)
-        while not frontier.empty():            
-            _, current_vertex_id = frontier.get()
-            if current_vertex_id == finish_vertex_id:
-                break
-            for edge in self.iter_vertex_edges(current_vertex_id):
-                next_vertex_id = edge.fromVertex() if edge.fromVertex() != current_vertex_id else edge.toVertex()
-                new_cost = cost_so_far[current_vertex_id] + self.edge_cost(edge)
-                if next_vertex_id not in cost_so_far or new_cost < cost_so_far[next_vertex_id]:
-                    cost_so_far[next_vertex_id] = new_cost
-                    priority = new_cost + self.calc_vertex_distance(next_vertex_id, finish_vertex_id)
-                    frontier.put((priority, next_vertex_id))
-                    came_from[next_vertex_id] = current_vertex_id  
-        # construct path
-        vertex_ids_path = []
-        pointer = finish_vertex_id
-        if finish_vertex_id not in came_from:
-            self.logger.log_info('Path not found')
-            return None
-        else:
-            while pointer is not None:
-                vertex_ids_path.append(pointer)
-                pointer = came_from[pointer]
-            return vertex_ids_path
-    
-    def linestring_from_vertex(self, vertex_ids_path):
-        pts = [self.network.vertex(i).point() for i in vertex_ids_path]
-        line = QgsGeometry.fromPolylineXY(pts)
-        return line
-    
-        
     def merge_linestring_layers(self, *layers):
         merged_layer = QgsVectorLayer('LineString', 'merged_edges', 'memory')
         merged_layer.setCrs(self.TARGET_CRS)
         features = []
         for layer in layers:
-            xform = QgsCoordinateTransform(layer.sourceCrs(), self.TARGET_CRS, QgsProject.instance())    
             for feature in layer.getFeatures():
                 xgeom = xform_geometry_4326(feature.geometry(), layer.sourceCrs())
                 feature.setGeometry(xgeom)
@@ -189,43 +330,276 @@ class DistanceCalculateFramework:
         provider.addFeatures(features)
         return merged_layer
         
-    def find_poi_by_name(self, name):
-        for layer, feature in self.iter_pois_by_name(name):
-            return layer, feature
+    def iter_search(self, tasks, worker_function, function):
+        # results are yielded in tasks order in both modes
+        if self.workers > 1 and len(tasks) > 1:
+            self.logger.log_info(f'Parallel distance calculation: {self.workers} processes')
+            context = multiprocessing.get_context('spawn')
+            context.set_executable(get_python_executable())
+            graph_folder = self.get_graph_folder()
+            try:
+                with context.Pool(self.workers, initializer=init_search_worker, initargs=(str(graph_folder),)) as pool:
+                    yield from pool.imap(worker_function, tasks, chunksize=8)
+            finally:
+                # graph of the project cache stays, temp copy is removed whatever the cache state is
+                if self.temp_graph_folder is not None:
+                    shutil.rmtree(str(self.temp_graph_folder), ignore_errors=True)
+                    self.temp_graph_folder = None
+                    self.graph_folder = None
         else:
-            return None, None
+            for task in tasks:
+                yield function(task)
+
+    def get_graph_folder(self):
+        # workers attach to the memory-mapped arrays of the tied graph
+        if self.graph_folder is None:
+            temp_folder = Path(tempfile.mkdtemp(prefix='velo_graph_'))
+            graph_cache = GraphCache(temp_folder)
+            graph_folder = graph_cache.save('tied', 'tmp', self.graph.to_arrays())
+            if graph_folder is None:
+                shutil.rmtree(str(temp_folder), ignore_errors=True)
+                raise Exception(f'Cant write graph for search processes: {graph_cache.error}')
+            self.graph_folder = graph_folder
+            self.temp_graph_folder = temp_folder
+        return self.graph_folder
+
+
+class DistanceCalculateFramework(RoutingGraphFramework):
+    NAMERU_FIELD_NAME = 'NameRU'
+    PIC_FIELD_NAME = 'PIC'
+    NAMEEN_FIELD_NAME = 'NameEN'
+    KM_FIELD_NAME = 'km'    
+    SIGN_ROUTECODE_FIELD_NAME = 'routcode'
+    SIGN_NUM_FIELD_NAME = 'Num'
+    ROAD_ROUTECODE_FIELD_NAME = 'CODE'
     
-    def iter_pois_by_name(self, name):
+    NAV = 'N/A'
+    ERRORV = 'Ошибка?'
+    
+    SEARCH_SIGN_TREE = 'sign_tree'
+    SEARCH_ALT = 'alt'
+    SEARCH_ALT_BIDIRECTIONAL = 'alt_bidirectional'
+    SEARCH_CONTRACTION_HIERARCHY = 'contraction_hierarchy'
+    # A* with straight line and elevation bound, the baseline for expanded vertices of other modes
+    SEARCH_SPHERICAL = 'spherical'
+    SEARCH_MODES = [SEARCH_SIGN_TREE, SEARCH_ALT, SEARCH_ALT_BIDIRECTIONAL, SEARCH_CONTRACTION_HIERARCHY, SEARCH_SPHERICAL]
+    # modes answering every sign-target pair by its own query instead of one expansion per sign
+    POINT_TO_POINT_MODES = [SEARCH_ALT, SEARCH_ALT_BIDIRECTIONAL, SEARCH_CONTRACTION_HIERARCHY, SEARCH_SPHERICAL]
+    
+    # services of one sign direction should stand together
+    SERVICE_RADIUS = 100
+    # services abreast of the sign are taken in both directions
+    DIRECTION_TOLERANCE = 50
+    
+    def __init__(
+            self, 
+            sign_layer, 
+            poi_layers, 
+            main_roads_layer, 
+            secondary_roads_layer, 
+            height_map, 
+            graph_tolerance, 
+            feedback,
+            height_interpolation=ElevationSampler.NEAREST,
+            use_graph_cache=True,
+            path_cache_size=10000,
+            path_cache_symmetric=True,
+            workers=0,
+            search_mode=SEARCH_SIGN_TREE,
+            landmark_count=8,
+            incremental=False,
+            service_radius=SERVICE_RADIUS,
+            ):
+        super().__init__(
+            sign_layer, 
+            poi_layers, 
+            main_roads_layer, 
+            secondary_roads_layer, 
+            height_map, 
+            graph_tolerance, 
+            feedback,
+            height_interpolation,
+            use_graph_cache,
+            workers,
+            )
+        self.main_road_spatial = QgsSpatialIndex(self.main_roads_layer.getFeatures())
+        self.path_cache = PathCache(path_cache_size, path_cache_symmetric)
+        self.search_mode = search_mode
+        self.search_stats = {'queries': 0, 'expanded': 0}
+        self.incremental = incremental
+        self.service_radius = service_radius
+        self.manifest = None
+        self.direction_record = None
+        self.init_output_fields()
+        self.init_direction_field_names()
+        self.build_poi_index()
+        self.build_service_clusters()
+        self.build_route_positions()
+        self.landmarks = None
+        self.contraction_hierarchy = None
+        if search_mode in (self.SEARCH_ALT, self.SEARCH_ALT_BIDIRECTIONAL):
+            self.landmarks = self.build_landmarks(landmark_count)
+        elif search_mode == self.SEARCH_CONTRACTION_HIERARCHY:
+            self.contraction_hierarchy = self.build_contraction_hierarchy()
+        self.current_direction = None
+        self.sign_paths = None
+    
+    def init_output_fields(self):
+        self.output_fields = QgsFields()
+        self.output_fields.append(QgsField('id', QVariant.Int))
+        self.output_fields.append(QgsField('length_2d', QVariant.Double))
+        self.output_fields.append(QgsField('length_3d', QVariant.Double))
+        self.output_fields.append(QgsField('direction', QVariant.String))
+    
+    def build_landmarks(self, landmark_count):
+        key = graph_cache_key(self.graph_key.encode(), str(landmark_count).encode())
+        arrays = self.graph_cache.load('landmarks', key) if self.graph_cache else None
+        if arrays is not None:
+            self.logger.log_info('Landmarks loaded from cache')
+            return Landmarks.from_arrays(arrays)
+        self.logger.log_info(f'Landmarks selection ({landmark_count})...')
+        landmarks = Landmarks.select(self.graph, landmark_count)
+        if self.graph_cache:
+            self.save_to_cache('landmarks', key, landmarks.to_arrays())
+        self.logger.log_info('Landmarks selected')
+        return landmarks
+
+    def build_contraction_hierarchy(self):
+        arrays = self.graph_cache.load('ch', self.graph_key) if self.graph_cache else None
+        if arrays is not None:
+            self.logger.log_info('Contraction hierarchy loaded from cache')
+            return ContractionHierarchy.from_arrays(arrays)
+        self.logger.log_info('Contraction hierarchy init...')
+        contraction_hierarchy = ContractionHierarchy.build(self.graph, self.feedback)
+        if self.graph_cache:
+            self.save_to_cache('ch', self.graph_key, contraction_hierarchy.to_arrays())
+        self.logger.log_info(f'Contraction hierarchy builded: {len(contraction_hierarchy.up_neighbours)} upward edges')
+        return contraction_hierarchy
+
+    def find_path(self, start_vertex_id, finish_vertex_id):
+        # returns (vertex ids, 2d length, 3d length, edge ids) or None
+        if self.sign_paths is not None:
+            # expansion from the sign has settled all its reachable targets
+            return self.sign_paths.get((start_vertex_id, finish_vertex_id))
+        # point-to-point modes ask for a pair again: find_closest_service measures every candidate
+        # and the winner is queried once more for its path feature, directions of a sign share targets
+        cached = self.path_cache.get(start_vertex_id, finish_vertex_id)
+        if cached is not None:
+            return cached
+        vertex_ids_path, slots = self.shortest_path(start_vertex_id, finish_vertex_id)
+        if not vertex_ids_path:
+            return None
+        l2d, l3d = self.calculate_path_distance(slots)
+        return self.path_cache.put(start_vertex_id, finish_vertex_id, vertex_ids_path, l2d, l3d, self.graph.slots_edges(slots))
+
+    def shortest_path(self, start_vertex_id, finish_vertex_id):
+        if start_vertex_id == -1:
+            raise Exception('Cant find start point on graph')
+        if finish_vertex_id == -1:
+            raise Exception('Cant find finish point on graph')
+        if self.search_mode == self.SEARCH_CONTRACTION_HIERARCHY:
+            vertex_ids_path, expanded = self.contraction_hierarchy.query(start_vertex_id, finish_vertex_id)
+            # unpacked shortcuts keep no slots of the original graph
+            slots = self.graph.path_slots(vertex_ids_path) if vertex_ids_path else None
+        elif self.search_mode == self.SEARCH_ALT_BIDIRECTIONAL:
+            vertex_ids_path, slots, expanded = bidirectional_astar(
+                self.graph, 
+                start_vertex_id, 
+                finish_vertex_id, 
+                self.landmarks.heuristic(self.graph, finish_vertex_id),
+                self.landmarks.heuristic(self.graph, start_vertex_id),
+                )
+        elif self.search_mode == self.SEARCH_SPHERICAL:
+            heuristic = spherical_heuristic(self.graph, finish_vertex_id)
+            vertex_ids_path, slots, expanded = astar(self.graph, start_vertex_id, finish_vertex_id, heuristic)
+        else:
+            heuristic = self.landmarks.heuristic(self.graph, finish_vertex_id)
+            vertex_ids_path, slots, expanded = astar(self.graph, start_vertex_id, finish_vertex_id, heuristic)
+        self.search_stats['queries'] += 1
+        self.search_stats['expanded'] += expanded
+        if vertex_ids_path is None:
+            self.logger.log_info('Path not found')
+        return vertex_ids_path, slots
+    
+    def linestring_from_vertex(self, vertex_ids_path):
+        pts = [QgsPointXY(*self.graph.coords[i]) for i in vertex_ids_path]
+        return self.linestring_from_points(pts)
+
+    def linestring_from_points(self, pts):
+        # sign standing on its POI shares the vertex with it - zero length path is written without geometry
+        if len(pts) < 2:
+            return QgsGeometry()
+        return QgsGeometry.fromPolylineXY(pts)
+    
+        
+    def build_poi_index(self):
+        self.logger.log_info('POI index init...')
+        self.poi_index = {}
         for layer in self.poi_layers:
+            field_names = layer.fields().names()
+            if self.NAMERU_FIELD_NAME not in field_names:
+                continue
+            pic_field = self.PIC_FIELD_NAME.lower()
+            has_pic = pic_field in field_names
+            has_nameen = self.NAMEEN_FIELD_NAME in field_names
+            layer_points = get_layer_points(layer, self.TARGET_CRS)
             for feature in layer.getFeatures():
-                if self.feature_has_field(feature, self.NAMERU_FIELD_NAME) and feature[self.NAMERU_FIELD_NAME] == name:
-                    yield layer, feature
+                name = feature[self.NAMERU_FIELD_NAME]
+                # features without geometry are not in layer points
+                if name == NULL or feature.id() not in layer_points:
+                    continue
+                entry = PoiEntry(
+                    layer,
+                    feature.id(),
+                    layer_points[feature.id()],
+                    feature[pic_field] if has_pic else NULL,
+                    feature[self.NAMEEN_FIELD_NAME] if has_nameen else NULL,
+                    )
+                self.poi_index.setdefault(name, []).append(entry)
+        duplicates = sorted(str(k) for k, v in self.poi_index.items() if len(v) > 1)
+        if duplicates:
+            self.logger.log_info(f'POI names with several objects: {", ".join(duplicates)}')
+        self.logger.log_info(f'POI index builded: {len(self.poi_index)} names')
+        
+    def find_poi_by_name(self, name):
+        for poi in self.iter_pois_by_name(name):
+            return poi
+    
+    def iter_pois_by_name(self, name):
+        return iter(self.poi_index.get(name, []))
                                  
         
     def iter_directions(self):
+        for direction in self.direction_field_names:
+            self.current_direction = direction
+            yield direction
+
+    def init_direction_field_names(self):
+        self.direction_field_names = {}
         nums = range(1,5)
         dirs = ['A', 'B']
         for i in product(nums, dirs):
             direction = ''.join(map(str, i))
-            self.current_direction = direction
-            yield direction
+            self.direction_field_names[direction] = {
+                'pic': '{}_{}'.format(self.PIC_FIELD_NAME, direction),
+                'nameru': '{}{}'.format(self.NAMERU_FIELD_NAME, direction),
+                'nameen': '{}{}'.format(self.NAMEEN_FIELD_NAME, direction),
+                'km': '{}_{}'.format(self.KM_FIELD_NAME, direction),
+                }
                                                     
         
-    def calculate_path_distance(self, vertex_ids):
-        l = 0
-        for i in range(len(vertex_ids)-1):
-            v1 = vertex_ids[i]
-            v2 = vertex_ids[i+1]
-            l += self.calc_vertex_distance(v1, v2)
-        return l
+    def calculate_path_distance(self, slots):
+        return self.graph.slots_lengths(slots)
     
-    def make_path_feature(self, vertex_ids):
+    def make_path_feature(self, vertex_ids, length_2d, length_3d):
+        return self.make_line_feature(self.linestring_from_vertex(vertex_ids), length_2d, length_3d)
+    
+    def make_line_feature(self, path_line, length_2d, length_3d):
         feature = QgsFeature()
         feature.setFields(self.output_fields)
-        path_line = self.linestring_from_vertex(vertex_ids)
         feature.setGeometry(path_line)
-        feature['length_3d'] = self.calculate_path_distance(vertex_ids)
-        feature['length_2d'] = self.DISTANCE_CALCULATOR.measureLength(path_line)
+        feature['length_2d'] = length_2d
+        feature['length_3d'] = length_3d
         feature['direction'] = self.current_direction
         return feature
     
@@ -245,8 +619,8 @@ class DistanceCalculateFramework:
             
     def is_service(self, feature, direction):
         self.logger.log_debug('Check is service...')
-        pic_field = '{}_{}'.format(self.PIC_FIELD_NAME, direction)
-        nameru_field = '{}{}'.format(self.NAMERU_FIELD_NAME, direction)
+        pic_field = self.direction_field_names[direction]['pic']
+        nameru_field = self.direction_field_names[direction]['nameru']
         pic_field_value = feature[pic_field]
         nameru_field_value = feature[nameru_field]
         if self.feature_has_fields(feature, pic_field, nameru_field):
@@ -255,110 +629,331 @@ class DistanceCalculateFramework:
                 return True   #TODO             
         return False
         
-    def get_shortest_path_feature(self, sign_feature, poi_layer, poi_feature):
-        sign_geom = xform_geometry_4326(sign_feature.geometry(), self.sign_layer.sourceCrs())
-        poi_geom = xform_geometry_4326(poi_feature.geometry(), poi_layer.sourceCrs())
+    def get_shortest_path_feature(self, sign_feature, poi):
         # calc shortest path
-        vertex_ids = self.shortest_path(sign_geom.asPoint(), poi_geom.asPoint())
-        if not vertex_ids:
+        path = self.find_path(self.find_vertex(self.sign_layer, sign_feature.id()), self.find_vertex(poi.layer, poi.feature_id))
+        if self.direction_record is not None:
+            keys = self.path_edge_keys(path[3]) if path else set()
+            self.direction_record.add_check((poi.point.x(), poi.point.y()), path[2] if path else None, keys)
+        if not path:
             self.logger.log_error('[processAlgorithm] Cannot build shortest path')
             return None
         else:
             # self.logger.log_info('[processAlgorithm] Shortest path calculated')
             # make path feature
-            path_feature = self.make_path_feature(vertex_ids)
+            path_feature = self.make_path_feature(*path[:3])
             return path_feature
         
         
+    def iter_sign_targets(self, sign_feature, directions=None):
+        for direction in self.iter_directions():
+            if directions is None or direction in directions:
+                yield from self.iter_direction_targets(sign_feature, direction)
+
+    def iter_direction_targets(self, sign_feature, direction):
+        if self.is_service(sign_feature, direction):
+            service_names = sign_feature[self.direction_field_names[direction]['pic']].split(' ')
+            for service_name in service_names:
+                yield from self.iter_services_ahead(sign_feature, service_name, direction)
+        else:
+            target_name = sign_feature[self.direction_field_names[direction]['nameru']]
+            if target_name != NULL and target_name != self.NAV:
+                poi = self.find_poi_by_name(target_name)
+                if poi is not None:
+                    yield poi
+
+    def make_sign_task(self, sign_feature, directions=None):
+        # one graph expansion for all targets of all directions
+        start_vertex_id = self.find_vertex(self.sign_layer, sign_feature.id())
+        if start_vertex_id == -1:
+            raise Exception('Cant find start point on graph')
+        targets = set()
+        for poi in self.iter_sign_targets(sign_feature, directions):
+            finish_vertex_id = self.find_vertex(poi.layer, poi.feature_id)
+            if finish_vertex_id == -1:
+                self.logger.log_error('Cant find finish point on graph')
+            else:
+                targets.add(finish_vertex_id)
+        return start_vertex_id, sorted(targets)
+
+    def iter_sign_paths(self, tasks):
+        return self.iter_search(tasks, search_sign_paths, lambda task: sign_paths(self.graph, *task))
+
     def find_closest_service(self, sign_feature, service_name):
-        reversed = self.current_direction[0] == 'B' 
-        ok_service_layer = ok_service_feature = None
+        ok_service = None
         min_distance = None
-        for service_layer, service_feature in self.iter_pois_by_name(service_name):
-            path = self.get_shortest_path_feature(sign_feature, service_layer, service_feature)
+        for service in self.iter_services_ahead(sign_feature, service_name, self.current_direction):
+            path = self.get_shortest_path_feature(sign_feature, service)
+            if path is None:
+                continue
             path_length = path['length_3d']
-            if True:    # тут должна быть проверка на направление
-                if min_distance is None or path_length < min_distance:
-                    min_distance = path_length
-                    ok_service_layer, ok_service_feature = service_layer, service_feature
-        if ok_service_feature:
-            return PackedFeature(ok_service_feature, ok_service_layer)
+            if min_distance is None or path_length < min_distance:
+                min_distance = path_length
+                ok_service = service
+        return ok_service
+
+    def iter_services_ahead(self, sign_feature, service_name, direction):
+        # services behind the sign are dropped before routing
+        for service in self.iter_pois_by_name(service_name):
+            if self.is_ahead(sign_feature, service, direction):
+                yield service
+
+    def is_ahead(self, sign_feature, poi, direction):
+        # A - along the route numbering, B - backwards; points of other routes are not compared
+        sign_code, sign_position = self.route_positions.get((self.sign_layer.id(), sign_feature.id()), (None, None))
+        poi_code, poi_position = self.route_positions.get(self.poi_key(poi), (None, None))
+        if sign_position is None or poi_position is None or sign_code != poi_code:
+            return True
+        reversed = direction[-1] == 'B'
+        if reversed:
+            return poi_position <= sign_position + self.DIRECTION_TOLERANCE
+        return poi_position >= sign_position - self.DIRECTION_TOLERANCE
+
+    def build_route_positions(self):
+        # (route code, chainage along the main route) for signs and POI
+        self.logger.log_info('Route chainage init...')
+        road_index = utils.RoadIndex(self.main_roads_layer)
+        point_store = utils.PointStore([self.sign_layer] + self.poi_layers)
+        point_indexes = utils.RoadOrder(road_index, point_store, self.graph_cache, self.feedback).run()
+        # signs are the first layer, so their order is the same as of the signs alone and main() reuses it
+        self.sign_order = road_index, point_store, point_indexes[point_store.layer_indexes[point_indexes] == 0]
+        # chainages are in meters
+        positions = road_index.route_chainages(point_store.road_ids, point_store.chainages)
+        self.route_positions = {}
+        for i, position in enumerate(positions.tolist()):
+            road_feature = road_index.features[int(point_store.road_ids[i])]
+            key = point_store.layer(i).id(), int(point_store.fids[i])
+            self.route_positions[key] = road_feature[self.ROAD_ROUTECODE_FIELD_NAME], position
     
-    def check_distance_beetween_services(self, service_packed_features):
-        for pair in combinations(service_packed_features, 2):
-            pt1 = pair[0].get_4326_geometry().asPoint()
-            pt2 = pair[1].get_4326_geometry().asPoint()
-            distance = self.DISTANCE_CALCULATOR.measureLine(pt1, pt2)
-            if distance > 100:
-                return False
-        return True
+    def check_distance_beetween_services(self, services):
+        # every pair of services should be closer than service radius
+        keys = sorted(set(self.poi_key(i) for i in services))
+        if len(keys) < 2:
+            return True
+        if not self.get_service_groups(tuple(sorted(set(self.poi_names[k] for k in keys)))):
+            return False
+        if len(set(self.service_clusters[k] for k in keys)) > 1:
+            return False
+        return all(pair in self.close_services for pair in combinations(keys, 2))
+
+    def get_service_groups(self, names):
+        # clusters containing all names, resolved once for every combination of names
+        if names not in self.service_groups:
+            groups = None
+            for name in names:
+                name_groups = set(self.service_clusters[self.poi_key(i)] for i in self.iter_pois_by_name(name))
+                groups = name_groups if groups is None else groups & name_groups
+            self.service_groups[names] = groups or set()
+        return self.service_groups[names]
+
+    def poi_key(self, poi):
+        return poi.layer.id(), poi.feature_id
+
+    def build_service_clusters(self):
+        # POI closer than service radius are linked, clusters are connected groups of links
+        self.logger.log_info('Service clusters init...')
+        self.service_clusters = {}
+        self.close_services = set()
+        self.service_groups = {}
+        self.poi_names = {}
+        entries = []
+        for name, name_entries in self.poi_index.items():
+            for entry in name_entries:
+                self.poi_names[self.poi_key(entry)] = name
+                entries.append(entry)
+        if not entries:
+            return
+        lons = np.radians([i.point.x() for i in entries])
+        lats = np.radians([i.point.y() for i in entries])
+        # planar coordinates never longer than the ellipsoidal distances, so no close pair is lost
+        xs = lons * np.cos(np.abs(lats).max()) * EARTH_RADIUS_LOWER_BOUND
+        ys = lats * EARTH_RADIUS_LOWER_BOUND
+        cells = {}
+        for i, cell in enumerate(zip((xs // self.service_radius).astype(np.int64).tolist(), (ys // self.service_radius).astype(np.int64).tolist())):
+            cells.setdefault(cell, []).append(i)
+        parents = list(range(len(entries)))
+        def find(i):
+            while parents[i] != i:
+                parents[i] = parents[parents[i]]
+                i = parents[i]
+            return i
+        for (cx, cy), indexes in cells.items():
+            for dx, dy in product((-1, 0, 1), repeat=2):
+                for j in cells.get((cx + dx, cy + dy), []):
+                    for i in indexes:
+                        if i >= j or hypot(xs[i] - xs[j], ys[i] - ys[j]) > self.service_radius:
+                            continue
+                        if self.DISTANCE_CALCULATOR.measureLine(entries[i].point, entries[j].point) <= self.service_radius:
+                            self.close_services.add(tuple(sorted((self.poi_key(entries[i]), self.poi_key(entries[j])))))
+                            parents[find(i)] = find(j)
+        for i, entry in enumerate(entries):
+            self.service_clusters[self.poi_key(entry)] = find(i)
+        self.logger.log_info(f'Service clusters builded: {len(set(self.service_clusters.values()))} clusters')
         
         
     def main(self):
         feature_num = 0
-        self.sign_layer.startEditing()
+        self.sign_writer = BulkAttributeWriter(self.sign_layer)
+        self.manifest = self.init_manifest() if self.incremental else None
         # for sign_feature in self.sign_layer.getFeatures():
-        for road_packed_feature, pt_packed_feature in utils.iter_points_along_road(self.main_roads_layer, [self.sign_layer], self.feedback):
+        signs = list(utils.iter_ordered_points(*self.sign_order, self.feedback))
+        stored = [self.get_stored_directions(pt_packed_feature.feature) for _, pt_packed_feature in signs]
+        if self.search_mode in self.POINT_TO_POINT_MODES:
+            if self.workers > 1:
+                self.logger.log_info(f'Search mode {self.search_mode} runs in one process')
+            all_sign_paths = repeat(None)
+        else:
+            tasks = [
+                self.make_sign_task(pt_packed_feature.feature, [i for i in self.direction_field_names if i not in sign_stored])
+                for (_, pt_packed_feature), sign_stored in zip(signs, stored)
+                ]
+            all_sign_paths = self.iter_sign_paths(tasks)
+        for (road_packed_feature, pt_packed_feature), sign_stored, sign_search in zip(signs, stored, all_sign_paths):
             feature_num += 1
+            if sign_search is None:
+                self.sign_paths = None
+            else:
+                self.sign_paths, expanded = sign_search
+                self.search_stats['queries'] += 1
+                self.search_stats['expanded'] += expanded
             sign_feature = pt_packed_feature.feature
             # general feature fields
             # sign_feature[self.SIGN_ROUTECODE_FIELD_NAME] = self.get_closest_road(sign_feature)[self.ROAD_ROUTECODE_FIELD_NAME]
-            sign_feature[self.SIGN_ROUTECODE_FIELD_NAME] = road_packed_feature.feature[self.ROAD_ROUTECODE_FIELD_NAME]
-            sign_feature[self.SIGN_NUM_FIELD_NAME] = feature_num
+            self.sign_writer.set(sign_feature, self.SIGN_ROUTECODE_FIELD_NAME, road_packed_feature.feature[self.ROAD_ROUTECODE_FIELD_NAME])
+            self.sign_writer.set(sign_feature, self.SIGN_NUM_FIELD_NAME, feature_num)
             # iter all direction fields
             for direction in self.iter_directions():
-                if self.is_service(sign_feature, direction):
-                    service_paths = []
-                    service_packed_features = []
-                    # find shortest path for every service
-                    service_names = sign_feature[self.PIC_FIELD_NAME + '_' + direction].split(' ')
-                    for service_name in service_names:
-                        service_packed_feature = self.find_closest_service(sign_feature, service_name)
-                        if service_packed_feature:
-                            path_feature = self.get_shortest_path_feature(sign_feature, service_packed_feature.layer, service_packed_feature.feature)
-                            service_paths.append(path_feature)
-                            service_packed_features.append(service_packed_feature)
-                        else:
-                            self.logger.log_info(f"Can't find service {service_name}")
-                            
-                    # all paths find and all shortest than 100 meters
-                    if service_paths:
-                        if self.check_distance_beetween_services(service_packed_features):
-                            closest_service_path = min(service_paths, key=lambda x: x['length_3d'])
-                            sign_feature[self.KM_FIELD_NAME + '_' + direction] = self.format_length(closest_service_path['length_3d'])
-                            yield closest_service_path
-                        else:
-                            self.logger.log_info(f"Service distance more than 100 meters")
-                            sign_feature[self.KM_FIELD_NAME + '_' + direction] = self.NAV
-                    else:
-                        self.logger.log_info(f"No services found")
-                        sign_feature[self.KM_FIELD_NAME + '_' + direction] = self.NAV
+                record = sign_stored.get(direction)
+                if record is not None:
+                    # direction is not changed - attributes stay as they are, paths are taken from manifest
+                    for length_2d, length_3d, points in record.paths:
+                        yield self.make_line_feature(self.linestring_from_points([QgsPointXY(x, y) for x, y in points]), length_2d, length_3d)
+                    continue
+                if self.manifest is not None:
+                    self.direction_record = DirectionRecord(self.direction_key(sign_feature, direction), self.get_sign_coords(sign_feature))
+                for path_feature in self.calculate_direction(sign_feature, direction):
+                    if self.direction_record is not None:
+                        points = [(pt.x(), pt.y()) for pt in path_feature.geometry().asPolyline()]
+                        self.direction_record.add_path(path_feature['length_2d'], path_feature['length_3d'], points)
+                    yield path_feature
+                if self.direction_record is not None:
+                    self.manifest.put(sign_feature.id(), direction, self.direction_record)
+                    self.direction_record = None
+        self.sign_paths = None
+        if self.search_mode in self.POINT_TO_POINT_MODES:
+            self.logger.log_info(f'Path cache: {self.path_cache.stats()}')
+        # sign tree makes one query per sign, other modes one per sign-target pair
+        self.logger.log_info(
+            f'Search ({self.search_mode}): {self.search_stats["queries"]} queries, '
+            f'{self.search_stats["expanded"]} expanded vertices'
+            )
+        self.sign_writer.commit()
+        self.logger.log_info(f'Sign attributes changed: {self.sign_writer.changed_count}')
+        if self.manifest is not None:
+            self.manifest.save()
+            self.logger.log_info(
+                f'Manifest saved: {self.manifest.stats["reused"]} directions reused, '
+                f'{self.manifest.stats["computed"]} directions calculated'
+                )
+
+    def calculate_direction(self, sign_feature, direction):
+        field_names = self.direction_field_names[direction]
+        if self.is_service(sign_feature, direction):
+            service_paths = []
+            services = []
+            # find shortest path for every service
+            service_names = sign_feature[field_names['pic']].split(' ')
+            for service_name in service_names:
+                service = self.find_closest_service(sign_feature, service_name)
+                if service:
+                    path_feature = self.get_shortest_path_feature(sign_feature, service)
+                    service_paths.append(path_feature)
+                    services.append(service)
                 else:
-                    # direction feature fields
-                    target_name = sign_feature[self.NAMERU_FIELD_NAME + direction]
-                    self.logger.log_debug(f'Target: {target_name}')
-                    if target_name == NULL or target_name == self.NAV:
-                        sign_feature[self.PIC_FIELD_NAME + '_' + direction] = self.NAV
-                        sign_feature[self.NAMEEN_FIELD_NAME + direction] = self.NAV
-                        sign_feature[self.KM_FIELD_NAME + '_' + direction] = self.NAV
+                    self.logger.log_info(f"Can't find service {service_name}")
+                    
+            # all paths find and all services are closer than service radius
+            if service_paths:
+                if self.check_distance_beetween_services(services):
+                    closest_service_path = min(service_paths, key=lambda x: x['length_3d'])
+                    self.sign_writer.set(sign_feature, field_names['km'], self.format_length(closest_service_path['length_3d']))
+                    yield closest_service_path
+                else:
+                    self.logger.log_info(f"Service distance more than {self.service_radius} meters")
+                    self.sign_writer.set(sign_feature, field_names['km'], self.NAV)
+            else:
+                self.logger.log_info(f"No services found")
+                self.sign_writer.set(sign_feature, field_names['km'], self.NAV)
+        else:
+            # direction feature fields
+            target_name = sign_feature[field_names['nameru']]
+            self.logger.log_debug(f'Target: {target_name}')
+            if target_name == NULL or target_name == self.NAV:
+                self.sign_writer.set(sign_feature, field_names['pic'], self.NAV)
+                self.sign_writer.set(sign_feature, field_names['nameen'], self.NAV)
+                self.sign_writer.set(sign_feature, field_names['km'], self.NAV)
+            else:
+                poi = self.find_poi_by_name(target_name)
+                if poi is None:
+                    self.sign_writer.set(sign_feature, field_names['pic'], self.ERRORV)
+                    self.sign_writer.set(sign_feature, field_names['nameen'], self.ERRORV)
+                    self.sign_writer.set(sign_feature, field_names['km'], self.ERRORV)
+                else:
+                    self.sign_writer.set(sign_feature, field_names['pic'], poi.pic)
+                    self.sign_writer.set(sign_feature, field_names['nameen'], poi.name_en)
+                    path_feature = self.get_shortest_path_feature(sign_feature, poi)
+                    if path_feature:
+                        self.sign_writer.set(sign_feature, field_names['km'], self.format_length(path_feature['length_3d']))
+                        yield path_feature
                     else:
-                        poi_layer, poi_feature = self.find_poi_by_name(target_name)
-                        if poi_feature is None:
-                            sign_feature[self.PIC_FIELD_NAME + '_' + direction] = self.ERRORV
-                            sign_feature[self.NAMEEN_FIELD_NAME + direction] = self.ERRORV
-                            sign_feature[self.KM_FIELD_NAME + '_' + direction] = self.ERRORV
-                        else:
-                            sign_feature[self.PIC_FIELD_NAME + '_' + direction] = poi_feature[self.PIC_FIELD_NAME.lower()]
-                            sign_feature[self.NAMEEN_FIELD_NAME + direction] = poi_feature[self.NAMEEN_FIELD_NAME]
-                            path_feature = self.get_shortest_path_feature(sign_feature, poi_layer, poi_feature)
-                            if path_feature:
-                                sign_feature[self.KM_FIELD_NAME + '_' + direction] = self.format_length(path_feature['length_3d'])
-                                yield path_feature
-                            else:
-                                sign_feature[self.KM_FIELD_NAME + '_' + direction] = self.NAV              
-            self.sign_layer.updateFeature(sign_feature)
-        self.sign_layer.commitChanges()
+                        self.sign_writer.set(sign_feature, field_names['km'], self.NAV)
+
+    ### INCREMENTAL MODE ###
+
+    def init_manifest(self):
+        if self.graph_cache is None:
+            self.logger.log_error('Incremental mode needs graph cache of saved project, all signs will be calculated')
+            return None
+        manifest = DistanceManifest(self.graph_cache.folder, graph_cache_key(self.sign_layer.id().encode())[:8])
+        settings_key = graph_cache_key(str(self.graph_tolerance).encode(), self.height_cache_key(), str(self.service_radius).encode())
+        loaded = manifest.load(settings_key)
+        manifest.compare_graph(self.graph.coords, self.graph.edge_from, self.graph.edge_to, self.edge_keys)
+        if loaded:
+            self.logger.log_info(
+                f'Manifest loaded: {len(manifest.removed_keys)} removed road edges, '
+                f'{len(manifest.added_points)} vertices of added road edges'
+                )
+        else:
+            self.logger.log_info('Manifest not found, all signs will be calculated')
+        return manifest
+
+    def get_stored_directions(self, sign_feature):
+        # {direction: DirectionRecord} for directions which could be kept from the last run
+        stored = {}
+        if self.manifest is None:
+            return stored
+        for direction in self.direction_field_names:
+            record = self.manifest.get(sign_feature.id(), direction, self.direction_key(sign_feature, direction))
+            if record is not None:
+                stored[direction] = record
+        return stored
+
+    def direction_key(self, sign_feature, direction):
+        field_names = self.direction_field_names[direction]
+        service_names = sign_feature[field_names['pic']] if self.is_service(sign_feature, direction) else None
+        targets = [
+            (poi.layer.id(), poi.feature_id, poi.point.x(), poi.point.y(), str(poi.pic), str(poi.name_en))
+            for poi in self.iter_direction_targets(sign_feature, direction)
+            ]
+        return make_direction_key(self.get_sign_coords(sign_feature), sign_feature[field_names['nameru']], service_names, targets)
+
+    def get_sign_coords(self, sign_feature):
+        pt = get_layer_points(self.sign_layer, self.TARGET_CRS)[sign_feature.id()]
+        return pt.x(), pt.y()
 
+    def path_edge_keys(self, edge_ids):
+        keys = self.edge_keys[edge_ids]
+        return set(keys[keys >= 0].tolist())
 
     def format_length(self, length):
         km = length / 1000
@@ -369,4 +964,87 @@ class DistanceCalculateFramework:
         return formatted_km
 
 
-                
\ No newline at end of file
+                
+
+
+class DistanceMatrixFramework(RoutingGraphFramework):
+    # sign x POI lengths need only the routing graph with tied points,
+    # service clusters, route positions and point-to-point indexes are not built
+    LOGGER_NAME = 'Distance Matrix Framework'
+    NAMERU_FIELD_NAME = DistanceCalculateFramework.NAMERU_FIELD_NAME
+
+    def distance_matrix(self, cutoff=None):
+        # sign x POI network lengths, one expansion per sign; pairs beyond cutoff are not stored
+        poi_layer_indexes, poi_ids, poi_vertex_ids, poi_categories = [], [], [], []
+        category_names = self.get_category_names()
+        category_indexes = {name: i for i, name in enumerate(sorted(set(category_names.values())))}
+        for layer_index, layer in enumerate(self.poi_layers):
+            for feature_id in get_layer_points(layer, self.TARGET_CRS):
+                vertex_id = self.find_vertex(layer, feature_id)
+                if vertex_id != -1:
+                    poi_layer_indexes.append(layer_index)
+                    poi_ids.append(feature_id)
+                    poi_vertex_ids.append(vertex_id)
+                    poi_categories.append(category_indexes.get(category_names.get((layer_index, feature_id)), -1))
+        poi_layer_indexes = np.array(poi_layer_indexes, dtype=np.int16)
+        poi_ids = np.array(poi_ids, dtype=np.int64)
+        poi_categories = np.array(poi_categories, dtype=np.int32)
+        # POI sharing a vertex are one target
+        targets, poi_targets = np.unique(np.array(poi_vertex_ids, dtype=np.int64), return_inverse=True)
+        targets = targets.tolist()
+        sign_ids = []
+        tasks = []
+        for feature_id in get_layer_points(self.sign_layer, self.TARGET_CRS):
+            vertex_id = self.find_vertex(self.sign_layer, feature_id)
+            if vertex_id == -1:
+                self.logger.log_error(f'Cant find sign {feature_id} on graph')
+                continue
+            sign_ids.append(feature_id)
+            tasks.append((vertex_id, targets, cutoff))
+        self.logger.log_info(f'Distance matrix: {len(tasks)} signs, {len(poi_ids)} POI, {len(targets)} targets')
+        columns = {'sign_id': [], 'poi_layer': [], 'poi_id': [], 'poi_category': [], 'length_2d': [], 'length_3d': []}
+        for i, (sign_id, (lengths_2d, lengths_3d)) in enumerate(zip(sign_ids, self.iter_distance_rows(tasks))):
+            if self.feedback.isCanceled():
+                break
+            lengths_2d = lengths_2d[poi_targets]
+            lengths_3d = lengths_3d[poi_targets]
+            reached = ~np.isnan(lengths_3d)
+            columns['sign_id'].append(np.full(reached.sum(), sign_id, dtype=np.int64))
+            columns['poi_layer'].append(poi_layer_indexes[reached])
+            columns['poi_id'].append(poi_ids[reached])
+            columns['poi_category'].append(poi_categories[reached])
+            columns['length_2d'].append(lengths_2d[reached].astype(np.float32))
+            columns['length_3d'].append(lengths_3d[reached].astype(np.float32))
+            self.feedback.setProgress(int((i + 1) / len(tasks) * 100))
+        dtypes = {'sign_id': np.int64, 'poi_layer': np.int16, 'poi_id': np.int64, 'poi_category': np.int32, 'length_2d': np.float32, 'length_3d': np.float32}
+        columns = {k: np.concatenate(v) if v else np.empty(0, dtype=dtypes[k]) for k, v in columns.items()}
+        columns['category_names'] = np.array(sorted(category_indexes), dtype=str)
+        return columns
+
+    def iter_distance_rows(self, tasks):
+        return self.iter_search(tasks, search_distance_row, lambda task: distance_row(self.graph, *task))
+
+    def get_category_names(self):
+        # {(layer index, feature id): NameRU}, services of one category share the name as in the direction search
+        names = {}
+        for layer_index, layer in enumerate(self.poi_layers):
+            if self.NAMERU_FIELD_NAME not in layer.fields().names():
+                continue
+            request = QgsFeatureRequest().setFlags(QgsFeatureRequest.NoGeometry)
+            request.setSubsetOfAttributes([self.NAMERU_FIELD_NAME], layer.fields())
+            for feature in layer.getFeatures(request):
+                name = feature[self.NAMERU_FIELD_NAME]
+                if name != NULL:
+                    names[layer_index, feature.id()] = str(name)
+        return names
+
+
+class PoiEntry:
+    __slots__ = ('layer', 'feature_id', 'point', 'pic', 'name_en')
+
+    def __init__(self, layer, feature_id, point, pic, name_en):
+        self.layer = layer
+        self.feature_id = feature_id
+        self.point = point
+        self.pic = pic
+        self.name_en = name_en
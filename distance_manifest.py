@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+# Inputs and results of distance calculation per sign direction, used to skip unchanged directions
+import json
+import os
+import tempfile
+from pathlib import Path
+import numpy as np
+from .routing import spherical_distances, graph_cache_key
+
+
+MANIFEST_VERSION = 2
+
+
+def make_direction_key(sign_point, target_name, service_names, targets):
+    # inputs of one sign direction: sign position, target name, services of a service direction
+    # and versions of all POI which could be chosen; PIC of a normal direction is an output, so it is not keyed
+    parts = [repr(tuple(sign_point)), str(target_name), str(service_names)]
+    parts += [repr(tuple(i)) for i in targets]
+    return graph_cache_key(*[i.encode() for i in parts])
+
+
+class DirectionRecord:
+    # checks - every path searched for the direction: (target lon, target lat, 3d length or None, road edge keys)
+    # paths - path features written for the direction: (2d length, 3d length, [(lon, lat)])
+    def __init__(self, key, sign_point):
+        self.key = key
+        self.sign_point = sign_point
+        self.checks = []
+        self.paths = []
+
+    def add_check(self, target_point, length_3d, keys):
+        check = (target_point[0], target_point[1], length_3d, sorted(keys))
+        if check not in self.checks:
+            self.checks.append(check)
+
+    def add_path(self, length_2d, length_3d, points):
+        self.paths.append((length_2d, length_3d, [(round(x, 9), round(y, 9)) for x, y in points]))
+
+    @classmethod
+    def from_dict(cls, data):
+        record = cls(data['key'], tuple(data['sign']))
+        record.checks = [tuple(i) for i in data['checks']]
+        record.paths = [tuple(i) for i in data['paths']]
+        return record
+
+    def to_dict(self):
+        return {'key': self.key, 'sign': self.sign_point, 'checks': self.checks, 'paths': self.paths}
+
+
+class DistanceManifest:
+    def __init__(self, folder, name):
+        self.folder = Path(folder)
+        self.name = name
+        self.settings_key = None
+        self.records = {}
+        self.new_records = {}
+        self.old_edge_keys = None
+        self.edge_keys = np.empty(0, dtype=np.int64)
+        self.removed_keys = set()
+        self.added_points = np.empty((0, 2))
+        self.stats = {'reused': 0, 'computed': 0}
+
+    @property
+    def records_file(self):
+        return self.folder / f'manifest_{self.name}.json'
+
+    @property
+    def edges_file(self):
+        return self.folder / f'manifest_{self.name}_edges.npy'
+
+    def load(self, settings_key):
+        # records of other settings (tolerance, heights) are not comparable
+        self.settings_key = settings_key
+        if not self.records_file.exists() or not self.edges_file.exists():
+            return False
+        try:
+            with open(str(self.records_file), encoding='utf-8') as f:
+                data = json.load(f)
+            old_edge_keys = np.load(str(self.edges_file))
+        except (OSError, ValueError):
+            return False
+        if data.get('version') != MANIFEST_VERSION or data.get('settings') != settings_key:
+            return False
+        self.records = {key: DirectionRecord.from_dict(value) for key, value in data['records'].items()}
+        self.old_edge_keys = old_edge_keys
+        return True
+
+    def compare_graph(self, coords, edge_from, edge_to, keys):
+        # road edges removed since the last run and vertices of the added ones
+        keys = np.asarray(keys)
+        self.edge_keys = np.unique(keys[keys >= 0])
+        if self.old_edge_keys is None:
+            return
+        self.removed_keys = set(np.setdiff1d(self.old_edge_keys, self.edge_keys).tolist())
+        added = np.isin(keys, np.setdiff1d(self.edge_keys, self.old_edge_keys))
+        vertex_ids = np.unique(np.concatenate([edge_from[added], edge_to[added]]))
+        self.added_points = np.asarray(coords)[vertex_ids].reshape(-1, 2)
+
+    def get(self, sign_id, direction, key):
+        # stored record if inputs are the same and no path could be changed by road edits
+        record = self.records.get(self.record_id(sign_id, direction))
+        if record is None or record.key != key or not self.is_valid(record):
+            return None
+        self.new_records[self.record_id(sign_id, direction)] = record
+        self.stats['reused'] += 1
+        return record
+
+    def put(self, sign_id, direction, record):
+        self.new_records[self.record_id(sign_id, direction)] = record
+        self.stats['computed'] += 1
+
+    def is_valid(self, record):
+        for target_x, target_y, length_3d, keys in record.checks:
+            if self.removed_keys and not self.removed_keys.isdisjoint(keys):
+                return False
+            if len(self.added_points):
+                if length_3d is None:
+                    return False
+                # path through added edge is not shorter than the way through its vertex
+                xs, ys = self.added_points[:, 0], self.added_points[:, 1]
+                bounds = spherical_distances(record.sign_point[0], record.sign_point[1], xs, ys)
+                bounds += spherical_distances(target_x, target_y, xs, ys)
+                if bounds.min() < length_3d:
+                    return False
+        return True
+
+    def record_id(self, sign_id, direction):
+        return f'{sign_id}|{direction}'
+
+    def save(self):
+        self.folder.mkdir(parents=True, exist_ok=True)
+        data = {
+            'version': MANIFEST_VERSION,
+            'settings': self.settings_key,
+            'records': {key: value.to_dict() for key, value in self.new_records.items()},
+            }
+        fd, tmp_name = tempfile.mkstemp(dir=str(self.folder), suffix='.json')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+        os.replace(tmp_name, str(self.records_file))
+        fd, tmp_name = tempfile.mkstemp(dir=str(self.folder), suffix='.npy')
+        with os.fdopen(fd, 'wb') as f:
+            np.save(f, self.edge_keys)
+        os.replace(tmp_name, str(self.edges_file))
@@ -0,0 +1,183 @@
+# -*- coding: utf-8 -*-
+
+from qgis.PyQt.QtCore import QCoreApplication
+from qgis.core import (
+    QgsProcessing,
+    QgsProcessingAlgorithm,
+    QgsProcessingParameterDefinition,
+    QgsProcessingParameterMultipleLayers,
+    QgsProcessingParameterBoolean,
+    QgsProcessingParameterFileDestination,
+    QgsProcessingParameterRasterLayer,
+    QgsProcessingParameterNumber,
+    QgsProcessingParameterVectorLayer,
+    QgsProcessingParameterEnum,
+    )
+from VeloRouteScripts.distance_framework import DistanceMatrixFramework
+from VeloRouteScripts.elevation import ElevationSampler
+from VeloRouteScripts import utils
+import numpy as np
+
+
+class DistanceMatrixAlgorithm(QgsProcessingAlgorithm):
+    MATRIX_OUTPUT = 'MATRIX_OUTPUT'
+    SIGN_INPUT = 'SIGN_INPUT'
+    MAIN_ROAD_INPUT = 'MAIN_ROAD_INPUT'
+    SECONDARY_ROAD_INPUT = 'SECONDARY_ROAD_INPUT'
+    POIS_INPUT = 'POIS_INPUT'
+    HEIGHTS_INPUT = 'HEIGHTS_INPUT'
+    CUTOFF = 'CUTOFF'
+    TOLERANCE = 'TOLERANCE'
+    HEIGHTS_INTERPOLATION = 'HEIGHTS_INTERPOLATION'
+    USE_GRAPH_CACHE = 'USE_GRAPH_CACHE'
+    WORKERS = 'WORKERS'
+
+    def initAlgorithm(self, config):
+        main_route_layer = utils.get_main_road_layer()
+        main_route_layer_name = main_route_layer.name() if main_route_layer else None
+        self.addParameter(
+            QgsProcessingParameterVectorLayer(
+                self.SIGN_INPUT,
+                self.tr('Слой с носителями'),
+                types = [QgsProcessing.TypeVectorPoint],
+                defaultValue = '123_DIR'
+            )
+        )
+        self.addParameter(
+            QgsProcessingParameterMultipleLayers(
+                self.POIS_INPUT,
+                self.tr('Слои с объектами'),
+                QgsProcessing.TypeVectorPoint,
+                defaultValue = ['POI', 'locality', 'transport', 'services']
+            )
+        )
+        self.addParameter(
+            QgsProcessingParameterVectorLayer(
+                self.MAIN_ROAD_INPUT,
+                self.tr('Слой с главными дорогами'),
+                types = [QgsProcessing.TypeVectorLine],
+                defaultValue = main_route_layer_name
+            )
+        )
+        self.addParameter(
+            QgsProcessingParameterVectorLayer(
+                self.SECONDARY_ROAD_INPUT,
+                self.tr('Слой с доп. дорогами'),
+                types = [QgsProcessing.TypeVectorLine],
+                defaultValue = 'secondary_routes',
+                optional=True,
+            )
+        )
+        self.addParameter(
+            QgsProcessingParameterRasterLayer(
+                self.HEIGHTS_INPUT,
+                self.tr('Слой с картой высот рельефа'),
+                optional=True,
+            )
+        )
+        self.addParameter(
+            QgsProcessingParameterNumber(
+                self.CUTOFF,
+                self.tr('Максимальное расстояние, м (0 - без ограничения)'),
+                QgsProcessingParameterNumber.Double,
+                0.0, False, 0,
+            )
+        )
+        self.addParameter(
+            QgsProcessingParameterFileDestination(
+                self.MATRIX_OUTPUT,
+                self.tr('Файл с матрицей расстояний'),
+                fileFilter='NumPy (*.npz)',
+            )
+        )
+
+        advanced_params = []
+        advanced_params.append(QgsProcessingParameterNumber(self.TOLERANCE,
+                                                   self.tr('Topology tolerance'),
+                                                   QgsProcessingParameterNumber.Double,
+                                                   0.0, False, 0, 99999999.99))
+        advanced_params.append(QgsProcessingParameterEnum(self.HEIGHTS_INTERPOLATION,
+                                                   self.tr('Интерполяция высот'),
+                                                   options=[self.tr('Ближайший пиксель'), self.tr('Билинейная')],
+                                                   defaultValue=0))
+        advanced_params.append(QgsProcessingParameterBoolean(self.USE_GRAPH_CACHE,
+                                                   self.tr('Кэшировать граф дорог в папке проекта'),
+                                                   defaultValue=True))
+        advanced_params.append(QgsProcessingParameterNumber(self.WORKERS,
+                                                   self.tr('Количество процессов расчета (0 - последовательно)'),
+                                                   QgsProcessingParameterNumber.Integer,
+                                                   0, False, 0, 64))
+        for p in advanced_params:
+            p.setFlags(p.flags() | QgsProcessingParameterDefinition.FlagAdvanced)
+            self.addParameter(p)
+
+    def processAlgorithm(self, parameters, context, feedback):
+        sign_layer = self.parameterAsLayer(parameters, self.SIGN_INPUT, context)
+        main_road_layer = self.parameterAsLayer(parameters, self.MAIN_ROAD_INPUT, context)
+        secondary_road_layer = self.parameterAsLayer(parameters, self.SECONDARY_ROAD_INPUT, context)
+        poi_layers = self.parameterAsLayerList(parameters, self.POIS_INPUT, context)
+        height_layer = self.parameterAsRasterLayer(parameters, self.HEIGHTS_INPUT, context)
+        cutoff = self.parameterAsDouble(parameters, self.CUTOFF, context)
+        tolerance = self.parameterAsDouble(parameters, self.TOLERANCE, context)
+        height_interpolation = ElevationSampler.METHODS[self.parameterAsEnum(parameters, self.HEIGHTS_INTERPOLATION, context)]
+        use_graph_cache = self.parameterAsBool(parameters, self.USE_GRAPH_CACHE, context)
+        workers = self.parameterAsInt(parameters, self.WORKERS, context)
+        output_file = self.parameterAsFileOutput(parameters, self.MATRIX_OUTPUT, context)
+
+        framework = DistanceMatrixFramework(
+            sign_layer,
+            poi_layers,
+            main_road_layer,
+            secondary_road_layer,
+            height_layer,
+            tolerance,
+            feedback,
+            height_interpolation,
+            use_graph_cache,
+            workers=workers,
+            )
+        columns = framework.distance_matrix(cutoff if cutoff > 0 else None)
+        columns['poi_layer_names'] = np.array([i.name() for i in poi_layers])
+        with open(output_file, 'wb') as f:
+            np.savez_compressed(f, **columns)
+        feedback.pushInfo(f'{len(columns["sign_id"])} distances saved to {output_file}')
+        return {self.MATRIX_OUTPUT: output_file}
+
+    def name(self):
+        return 'distance_matrix'
+
+    def displayName(self):
+        return 'Матрица расстояний'
+
+    def group(self):
+        return 'Веломаршрут'
+
+    def groupId(self):
+        return 'Group1'
+
+    def tr(self, string):
+        return QCoreApplication.translate('Processing', string)
+
+    def createInstance(self):
+        return DistanceMatrixAlgorithm()
+
+    def shortHelpString(self):
+        return "<b>Параметры</b><ul>"\
+                "<li><b>Слой с носителями</b> - слой, от объектов которого считаются расстояния</li>"\
+                "<li><b>Слой с объектами</b> - все объекты этих слоев (в том числе сервисы) "\
+                "попадают в матрицу, независимо от названий</li>"\
+                "<li><b>Слой с главными дорогами</b> и <b>Слой с доп.дорогами</b> - сеть передвижения</li>"\
+                "<li><b>Слой с картой высот рельефа</b> - растр высот для расчета 3d длины</li>"\
+                "<li><b>Максимальное расстояние</b> - пары носитель-объект дальше этого расстояния (3d) "\
+                "не записываются, расчет от носителя останавливается на этом расстоянии</li>"\
+                "<li><b>Количество процессов расчета</b> - если больше 1, носители считаются параллельно</li>"\
+                "</ul>"\
+                "<b>Результат</b><ul>"\
+                "<li>Файл .npz (numpy.load) с колонками одинаковой длины: sign_id - id носителя, "\
+                "poi_layer - номер слоя объекта в poi_layer_names, poi_id - id объекта, "\
+                "poi_category - номер категории объекта (значения NameRU, как при поиске сервисов) "\
+                "в category_names или -1, если название не задано, "\
+                "length_2d и length_3d - длины кратчайшего пути по сети в метрах. "\
+                "Для каждого носителя выполняется один обход сети до всех объектов; "\
+                "строится только граф дорог, без групп сервисов и пикетажа маршрута</li>"\
+                "</ul>"
@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+from qgis.core import (
+    Qgis,
+    QgsRectangle,
+    )
+from .utils import get_transform, transform_coords
+
+
+class ElevationSampler:
+    NEAREST = 'nearest'
+    BILINEAR = 'bilinear'
+    METHODS = [NEAREST, BILINEAR]
+
+    DTYPES = {
+        Qgis.Byte: np.uint8,
+        Qgis.UInt16: np.uint16,
+        Qgis.Int16: np.int16,
+        Qgis.UInt32: np.uint32,
+        Qgis.Int32: np.int32,
+        Qgis.Float32: np.float32,
+        Qgis.Float64: np.float64,
+        }
+
+    def __init__(self, raster_layer, extent=None, extent_crs=None, band=1, method=NEAREST):
+        if method not in self.METHODS:
+            raise Exception(f'Unknown elevation sampling method {method}')
+        self.method = method
+        self.crs = raster_layer.crs()
+        provider = raster_layer.dataProvider()
+        self.pixel_x = raster_layer.rasterUnitsPerPixelX()
+        self.pixel_y = raster_layer.rasterUnitsPerPixelY()
+        block_extent = self.get_block_extent(raster_layer.extent(), extent, extent_crs)
+        self.xmin = block_extent.xMinimum()
+        self.ymax = block_extent.yMaximum()
+        self.width = max(1, int(round(block_extent.width() / self.pixel_x)))
+        self.height = max(1, int(round(block_extent.height() / self.pixel_y)))
+        self.array = self.read_block(provider, band, block_extent)
+
+    def get_block_extent(self, raster_extent, extent, extent_crs):
+        if extent is None:
+            return raster_extent
+        if extent_crs is not None and extent_crs != self.crs:
+            extent = get_transform(extent_crs, self.crs).transformBoundingBox(extent)
+        extent = extent.intersect(raster_extent)
+        if extent.isEmpty():
+            return raster_extent
+        # align the block to the raster grid, so block pixels are the raster pixels
+        x0, y1 = raster_extent.xMinimum(), raster_extent.yMaximum()
+        xmin = x0 + np.floor((extent.xMinimum() - x0) / self.pixel_x) * self.pixel_x
+        xmax = x0 + np.ceil((extent.xMaximum() - x0) / self.pixel_x) * self.pixel_x
+        ymax = y1 - np.floor((y1 - extent.yMaximum()) / self.pixel_y) * self.pixel_y
+        ymin = y1 - np.ceil((y1 - extent.yMinimum()) / self.pixel_y) * self.pixel_y
+        return QgsRectangle(xmin, ymin, xmax, ymax)
+
+    def read_block(self, provider, band, block_extent):
+        block = provider.block(band, block_extent, self.width, self.height)
+        dtype = self.DTYPES.get(block.dataType())
+        if dtype is None:
+            raise Exception(f'Unsupported raster data type {block.dataType()}')
+        array = np.frombuffer(bytes(block.data()), dtype=dtype).reshape(self.height, self.width)
+        array = array.astype(np.float64)
+        if block.hasNoDataValue():
+            array[array == block.noDataValue()] = np.nan
+        return array
+
+    def sample(self, xs, ys):
+        # xs, ys - coordinates in raster crs; returns nan outside of the block
+        xs = np.asarray(xs, dtype=np.float64)
+        ys = np.asarray(ys, dtype=np.float64)
+        cols = (xs - self.xmin) / self.pixel_x - 0.5
+        rows = (self.ymax - ys) / self.pixel_y - 0.5
+        outside = (cols < -0.5) | (rows < -0.5) | (cols > self.width - 0.5) | (rows > self.height - 0.5)
+        if self.method == self.BILINEAR:
+            values = self.sample_bilinear(cols, rows)
+        else:
+            values = self.sample_nearest(cols, rows)
+        values[outside] = np.nan
+        return values
+
+    def sample_nearest(self, cols, rows):
+        icols = np.clip(np.rint(cols).astype(np.int64), 0, self.width - 1)
+        irows = np.clip(np.rint(rows).astype(np.int64), 0, self.height - 1)
+        return self.array[irows, icols]
+
+    def sample_bilinear(self, cols, rows):
+        cols = np.clip(cols, 0, self.width - 1)
+        rows = np.clip(rows, 0, self.height - 1)
+        c0 = np.floor(cols).astype(np.int64)
+        r0 = np.floor(rows).astype(np.int64)
+        c1 = np.minimum(c0 + 1, self.width - 1)
+        r1 = np.minimum(r0 + 1, self.height - 1)
+        dc = cols - c0
+        dr = rows - r0
+        top = self.array[r0, c0] * (1 - dc) + self.array[r0, c1] * dc
+        bottom = self.array[r1, c0] * (1 - dc) + self.array[r1, c1] * dc
+        values = top * (1 - dr) + bottom * dr
+        # nodata neighbours - fallback to nearest pixel
+        missing = np.isnan(values)
+        if missing.any():
+            values[missing] = self.sample_nearest(cols[missing], rows[missing])
+        return values
+
+    def sample_points(self, points, points_crs, nodata_value=0):
+        # points - sequence of (x, y) in points_crs
+        coords = transform_coords(points, points_crs, self.crs)
+        values = self.sample(coords[:, 0], coords[:, 1])
+        values[np.isnan(values)] = nodata_value
+        return values
@@ -10,14 +10,33 @@ from qgis._core import (
     QgsCoordinateReferenceSystem,
     QgsExpressionContextUtils,
     QgsRenderContext,
+    QgsApplication,
+    QgsPrintLayout,
+    QgsReadWriteContext,
+    QgsVectorLayer,
+    QgsField,
+    QgsFeature,
+    QgsExpression,
+    QgsProperty,
+    QgsLayoutObject,
+    QgsLayoutItemMap,
+    QgsLayoutItemHtml,
+    QgsRuleBasedRenderer,
+    QgsRuleBasedLabeling,
+    QgsPalLayerSettings,
+    QgsFeatureRequest,
     )
+from qgis.PyQt.QtXml import QDomDocument
+from qgis.PyQt.QtCore import QVariant
 from VeloRouteScripts import utils
+import multiprocessing
 import time
 import os
 
 
 
 class PageGeneratorFramework:    
+    template_path = Path(__file__).parent / 'layout_templates' / 'layout_template.qpt'
     nonprint_table_columns = ['id', 'num', 'type', 'routcode', 'degree']    
     id_field = 'id'
     feature_route_code_field = 'routcode'
@@ -40,6 +59,7 @@ class PageGeneratorFramework:
         self.feedback = feedback
         self.logger = utils.FeedbackLogger(__name__, self.feedback)
         self.logger.log_debug('Init...')
+        utils.reset_caches()
         self.project = QgsProject.instance()
         self.lay_mng = self.project.layoutManager()
         self.reference_layout = self.lay_mng.layoutByName(reference_layout_name)
@@ -47,9 +67,14 @@ class PageGeneratorFramework:
         self.route_codes = export_route_codes
         self.current_feature = None
         self.current_layer = None
+        self.current_record = None
+        self.original_styles = {}
+        self.coverage_layer = None
         self.current_page = None
         self.road_layer = utils.get_main_road_layer()
         self.general_map_margin = 0.05
+        self.road_bboxes = None
+        self.route_extents = {}
         self.wf_types_folder = wf_types_folder
         # items which we modify
         self.coords_label_id = coords_label_id
@@ -69,7 +94,8 @@ class PageGeneratorFramework:
         else:
             return item
         
-    def get_pdf_settings(self):
+    @staticmethod
+    def get_pdf_settings():
         settings = QgsLayoutExporter.PdfExportSettings()
         # settings.forceVectorOutput = False
         settings.exportMetadata = False
@@ -93,6 +119,22 @@ class PageGeneratorFramework:
         new_name = self.lay_mng.generateUniqueTitle()
         return self.lay_mng.duplicateLayout(self.reference_layout, new_name)
     
+    def load_reference_layout(self):
+        # standalone copy, not registered in layout manager
+        if self.reference_layout is not None:
+            return self.reference_layout.clone()
+        self.logger.log_info(f'Reference layout not found, load template {self.template_path}')
+        document = QDomDocument()
+        with open(self.template_path, encoding='utf-8') as f:
+            document.setContent(f.read())
+        layout = QgsPrintLayout(self.project)
+        context = QgsReadWriteContext()
+        context.setPathResolver(self.project.pathResolver())
+        _, ok = layout.loadFromTemplate(document, context)
+        if not ok:
+            raise Exception(f'Cant load layout template {self.template_path}')
+        return layout
+
     def remove_layout(self, layout):
         self.logger.log_debug('Remove layout {layout.name()}')
         return self.lay_mng.removeLayout(layout)
@@ -119,93 +161,126 @@ class PageGeneratorFramework:
     def extent_general_map(self, layout):
         self.logger.log_info('Extent general map...')
         map_item = self.get_layout_item(layout, self.general_map_id)
-        map_crs = map_item.crs()
+        map_item.zoomToExtent(self.get_general_map_extent(map_item.crs()))
+        self.logger.log_info('DONE')
+
+    def get_general_map_extent(self, map_crs):
         field_names = [i.name() for i in self.current_feature.fields()]
         if self.feature_route_code_field not in field_names:
             raise Exception(f'Cant find attribute {self.feature_route_code_field} in layer {self.current_layer.name()}')
         else:
             road_code = self.current_feature[self.feature_route_code_field]
-            minx,miny,maxx,maxy = self.get_road_extent(road_code)
-            min_pt = QgsGeometry.fromPointXY(QgsPointXY(minx, miny))
-            max_pt = QgsGeometry.fromPointXY(QgsPointXY(maxx, maxy))
-            min_pt = utils.xform_geometry(min_pt, self.road_layer.sourceCrs(), map_crs)
-            max_pt = utils.xform_geometry(max_pt, self.road_layer.sourceCrs(), map_crs)
-            new_extent = QgsRectangle(min_pt.asPoint(), max_pt.asPoint())
-            #add margin
-            ymargin = new_extent.height()*self.general_map_margin
-            xmargin = new_extent.height()*self.general_map_margin
-            new_extent.setXMinimum(new_extent.xMinimum() - xmargin)
-            new_extent.setYMinimum(new_extent.yMinimum() - ymargin)
-            new_extent.setXMaximum(new_extent.xMaximum() + xmargin)
-            new_extent.setYMaximum(new_extent.yMaximum() + ymargin)
-            map_item.zoomToExtent(new_extent)
-            self.logger.log_info('DONE')
-        
-        
-    def get_road_extent(self, road_code):
-        result_bbox = None
-        for road_feature in self.road_layer.getFeatures():
-            if road_feature[self.road_route_code_field] == road_code:
-                bbox = road_feature.geometry().boundingBox()
-                if result_bbox is None:
-                    result_bbox = bbox
-                else:
-                    result_bbox.combineExtentWith(bbox)
-        if result_bbox is None:
-            raise Exception(f'Not found roads with code {road_code}')
-        else:            
-            return result_bbox.xMinimum(), result_bbox.yMinimum(), result_bbox.xMaximum(), result_bbox.yMaximum()
+            route_extents = self.get_route_extents(map_crs)
+            if road_code not in route_extents:
+                raise Exception(f'Not found roads with code {road_code}')
+            return QgsRectangle(route_extents[road_code])
+
+    def get_route_extents(self, map_crs):
+        # {route code: extent with margins in map_crs}, computed once per run for each map crs
+        key = utils.crs_key(map_crs)
+        if key not in self.route_extents:
+            if self.road_bboxes is None:
+                self.road_bboxes = self.get_road_bboxes()
+            xform = utils.get_transform(self.road_layer.sourceCrs(), map_crs)
+            extents = {}
+            for road_code, bbox in self.road_bboxes.items():
+                min_pt = xform.transform(QgsPointXY(bbox.xMinimum(), bbox.yMinimum()))
+                max_pt = xform.transform(QgsPointXY(bbox.xMaximum(), bbox.yMaximum()))
+                new_extent = QgsRectangle(min_pt, max_pt)
+                #add margin
+                ymargin = new_extent.height()*self.general_map_margin
+                xmargin = new_extent.height()*self.general_map_margin
+                new_extent.setXMinimum(new_extent.xMinimum() - xmargin)
+                new_extent.setYMinimum(new_extent.yMinimum() - ymargin)
+                new_extent.setXMaximum(new_extent.xMaximum() + xmargin)
+                new_extent.setYMaximum(new_extent.yMaximum() + ymargin)
+                extents[road_code] = new_extent
+            self.route_extents[key] = extents
+        return self.route_extents[key]
+
+    def get_road_bboxes(self):
+        # {route code: bounding box of its roads in road layer crs}, one pass over the road layer
+        request = QgsFeatureRequest().setSubsetOfAttributes([self.road_route_code_field], self.road_layer.fields())
+        bboxes = {}
+        for road_feature in self.road_layer.getFeatures(request):
+            road_code = road_feature[self.road_route_code_field]
+            bbox = road_feature.geometry().boundingBox()
+            if road_code not in bboxes:
+                bboxes[road_code] = bbox
+            else:
+                bboxes[road_code].combineExtentWith(bbox)
+        return bboxes
         
-    def change_picture(self, layout):
-        self.logger.log_info('Change wf pic...')
-        pic_item = self.get_layout_item(layout, self.wf_pic_id)
+    def get_picture_path(self):
         pic_path = os.path.join(self.wf_types_folder, self.current_layer.name() + '.jpg')
         if os.path.exists(pic_path):
-            pic_item.setPicturePath(str(pic_path))
+            return str(pic_path)
         else:
             raise Exception(f'Path {pic_path} not found!')
+
+    def change_picture(self, layout):
+        self.logger.log_info('Change wf pic...')
+        pic_item = self.get_layout_item(layout, self.wf_pic_id)
+        pic_item.setPicturePath(self.get_picture_path())
         self.logger.log_info('DONE')
+
+    def get_label_texts(self):
+        # {item id: text}
+        pt = self.get_transformed_current_point(QgsCoordinateReferenceSystem("EPSG:4326"))
+        return {
+            self.page_label_id: 'стр ' + str(self.current_page),
+            self.coords_label_id: '%.6f, %.6f'% (pt.x(), pt.y()),
+            self.route_label_id: 'Участок %s' % self.current_feature[self.feature_route_code_field],
+            }
         
     def update_labels(self, layout):
         self.logger.log_info('Update labels...')
-        pt = self.get_transformed_current_point(QgsCoordinateReferenceSystem("EPSG:4326"))
-        self.get_layout_item(layout, self.page_label_id).setText('стр ' + str(self.current_page))
-        self.get_layout_item(layout, self.coords_label_id).setText('%.6f, %.6f'% (pt.x(), pt.y()))
-        self.get_layout_item(layout, self.route_label_id).setText('Участок %s' % self.current_feature[self.feature_route_code_field])
+        for item_id, text in self.get_label_texts().items():
+            self.get_layout_item(layout, item_id).setText(text)
         self.logger.log_info('DONE')
         
+    def set_page_filters(self, expressions):
+        # {layer: filter expression}
+        for layer, expression in expressions.items():
+            self.original_styles[layer.id()] = (layer,) + set_layer_filter(layer, expression)
+
+    def get_layout_filters(self):
+        return {layer: get_layout_filter(layer, self.id_field) for layer in self.layers}
+
+    def restore_page_filters(self):
+        for layer, renderer, labeling in self.original_styles.values():
+            restore_layer_style(layer, renderer, labeling)
+        self.original_styles = {}
+
     def turn_on_all_features(self):
+        # subset strings of older exports, provider is reloaded only if there is something to reset
         self.logger.log_debug('Turn on layers')
         for layer in self.layers:
-            layer.setSubsetString('')
-        
-    def turn_off_all_features(self):
-        self.logger.log_debug('Turn off layers')
-        for layer in self.layers:
-            layer.setSubsetString('{}=-1'.format(self.id_field))
+            if layer.subsetString():
+                layer.setSubsetString('')
         
     def iter_ordered_features(self):
         self.turn_on_all_features()
-        for road_packed_feature, pt_packed_feature in utils.iter_points_along_road(self.road_layer, self.layers, self.feedback):
+        for road_packed_feature, pt_packed_feature in utils.iter_points_along_road(self.road_layer, self.layers, self.feedback, utils.get_project_cache()):
             if pt_packed_feature.feature[self.feature_route_code_field] in self.route_codes:                
                 yield pt_packed_feature
                      
     def get_transformed_current_point(self, target_crs):
-        geometry = self.current_feature.geometry()
-        geometry = utils.xform_geometry(geometry, self.current_layer.sourceCrs(), target_crs)
-        return geometry.asPoint()
+        return self.current_record.get_transformed_point(target_crs)
         
-    def generate_table(self, layout):
-        self.logger.log_info('Update data table...')
-        table_item = self.get_layout_item(layout, self.data_table_id).multiFrame()
+    def get_table_html(self):
         feature_fields = [i.name() for i in self.current_feature.fields()]
         feature_attributes = self.current_feature.attributes()
         trs = []
         for k,v in zip(feature_fields, feature_attributes):
             if k.lower() not in self.nonprint_table_columns:
                 trs.append(f'<tr><td>{k}</td><td>{v}</td></tr>')
-        html_table = f'<table><thead><tr><th>Инфоплан</th><th></th></tr></thead><tbody>{"".join(trs)}</tbody></table>'
-        table_item.setHtml(html_table)
+        return f'<table><thead><tr><th>Инфоплан</th><th></th></tr></thead><tbody>{"".join(trs)}</tbody></table>'
+
+    def generate_table(self, layout):
+        self.logger.log_info('Update data table...')
+        table_item = self.get_layout_item(layout, self.data_table_id).multiFrame()
+        table_item.setHtml(self.get_table_html())
         # программа крашится
         # table_item.loadHtml()
         self.logger.log_info('DONE')
@@ -230,13 +305,14 @@ class PageGeneratorFramework:
         self.logger.log_debug('Generate id')
         self.turn_on_all_features()
         for layer in self.layers:
-            layer.startEditing()
+            writer = utils.BulkAttributeWriter(layer)
             for i,feature in enumerate(layer.getFeatures()):
-                feature.setAttribute(self.id_field, i+1)
-                layer.updateFeature(feature)
-            layer.commitChanges()
+                writer.set(feature, self.id_field, i+1)
+            writer.commit()
     
     def generate_layouts(self):
+        if self.reference_layout is None:
+            raise Exception('Reference layout not found in project, layouts can not be duplicated')
         self.generate_id()
         export_folder = self.generate_export_folder()      
         self.current_page = 1
@@ -250,6 +326,7 @@ class PageGeneratorFramework:
                 self.logger.log_info(f'Generating layout: layer = {layer.name()}, feature_id = {feature[self.id_field]}')
                 self.current_feature = feature
                 self.current_layer = layer
+                self.current_record = pt_packed_feature
                 layout = self.duplicate_reference_layout()
                 self.update_layout(layout)
                 # сохраняем переменные для экспорта
@@ -264,34 +341,359 @@ class PageGeneratorFramework:
                 self.current_page += 1
         utils.save_project()
         return layouts
+
+    def stream_layouts(self):
+        # one layout for all pages, each page is exported right after update
+        self.generate_id()
+        export_folder = self.generate_export_folder()
+        layout = self.load_reference_layout()
+        self.current_page = 1
+        try:
+            # wrapped layers are recorded one by one, so a failure midway is rolled back too
+            self.set_page_filters(self.get_layout_filters())
+            for pt_packed_feature in self.iter_ordered_features():
+                if self.feedback.isCanceled():
+                    break
+                else:
+                    layer = pt_packed_feature.layer
+                    feature = pt_packed_feature.feature
+                    self.logger.log_info(f'Export page {self.current_page}: layer = {layer.name()}, feature_id = {feature[self.id_field]}')
+                    self.current_feature = feature
+                    self.current_layer = layer
+                    self.current_record = pt_packed_feature
+                    self.update_layout(layout)
+                    QgsExpressionContextUtils.setLayoutVariables(layout, {
+                        'export_layer_id': layer.id(),
+                        'export_feature_id': feature[self.id_field],
+                        })
+                    self.export(export_folder, layout, self.current_page)
+                    self.current_page += 1
+        finally:
+            self.restore_page_filters()
+        return export_folder
     
-    def export_layouts_by_names(self, layout_names, del_layout=False):
+    ### ATLAS ###
+
+    def get_label_fields(self):
+        # {item id: coverage field}
+        return {
+            self.page_label_id: 'page_label',
+            self.coords_label_id: 'coords_label',
+            self.route_label_id: 'route_label',
+            }
+
+    def build_coverage_layer(self, layout):
+        # one point per page in iter_ordered_features order with all page values precomputed
+        general_map_crs = self.get_layout_item(layout, self.general_map_id).crs()
+        coverage = QgsVectorLayer('Point?crs=EPSG:4326', 'pages', 'memory')
+        fields = [QgsField('page', QVariant.Int), QgsField('layer_id', QVariant.String), QgsField('feature_id', QVariant.Int)]
+        fields += [QgsField(i, QVariant.String) for i in list(self.get_label_fields().values()) + ['pic_path', 'table_html']]
+        fields += [QgsField(i, QVariant.Double) for i in ['xmin', 'ymin', 'xmax', 'ymax']]
+        coverage.dataProvider().addAttributes(fields)
+        coverage.updateFields()
+        crs_4326 = QgsCoordinateReferenceSystem('EPSG:4326')
+        label_fields = self.get_label_fields()
+        features = []
+        self.current_page = 1
+        for pt_packed_feature in self.iter_ordered_features():
+            if self.feedback.isCanceled():
+                break
+            self.current_feature = pt_packed_feature.feature
+            self.current_layer = pt_packed_feature.layer
+            self.current_record = pt_packed_feature
+            values = {
+                'page': self.current_page,
+                'layer_id': self.current_layer.id(),
+                'feature_id': self.current_feature[self.id_field],
+                }
+            funcs = [
+                lambda: {label_fields[k]: v for k, v in self.get_label_texts().items()},
+                lambda: {'pic_path': self.get_picture_path()},
+                lambda: {'table_html': self.get_table_html()},
+                lambda: self.get_extent_values(self.get_general_map_extent(general_map_crs)),
+                ]
+            for f in funcs:
+                try:
+                    values.update(f())
+                except Exception as e:
+                    self.logger.log_error(f'ERROR on page {self.current_page}: {e}')
+            feature = QgsFeature(coverage.fields())
+            for k, v in values.items():
+                feature[k] = v
+            feature.setGeometry(QgsGeometry.fromPointXY(pt_packed_feature.get_transformed_point(crs_4326)))
+            features.append(feature)
+            self.current_page += 1
+        coverage.dataProvider().addFeatures(features)
+        self.logger.log_info(f'Atlas coverage: {len(features)} pages')
+        return coverage
+
+    def get_extent_values(self, extent):
+        return {'xmin': extent.xMinimum(), 'ymin': extent.yMinimum(), 'xmax': extent.xMaximum(), 'ymax': extent.yMaximum()}
+
+    def configure_atlas_maps(self, layout):
+        place_map = self.get_layout_item(layout, self.place_map_id)
+        place_map.setAtlasDriven(True)
+        place_map.setAtlasScalingMode(QgsLayoutItemMap.Fixed)
+        general_map = self.get_layout_item(layout, self.general_map_id)
+        general_map.setAtlasDriven(False)
+        properties = general_map.dataDefinedProperties()
+        for key, field in zip([QgsLayoutObject.MapXMin, QgsLayoutObject.MapYMin, QgsLayoutObject.MapXMax, QgsLayoutObject.MapYMax],
+                              ['xmin', 'ymin', 'xmax', 'ymax']):
+            properties.setProperty(key, QgsProperty.fromField(field))
+        general_map.setDataDefinedProperties(properties)
+
+    def configure_atlas_picture(self, layout):
+        pic_item = self.get_layout_item(layout, self.wf_pic_id)
+        properties = pic_item.dataDefinedProperties()
+        properties.setProperty(QgsLayoutObject.PictureSource, QgsProperty.fromField('pic_path'))
+        pic_item.setDataDefinedProperties(properties)
+
+    def configure_atlas_table(self, layout):
+        table_item = self.get_layout_item(layout, self.data_table_id).multiFrame()
+        table_item.setContentMode(QgsLayoutItemHtml.ManualHtml)
+        table_item.setEvaluateExpressions(True)
+        table_item.setHtml('[% "table_html" %]')
+
+    def configure_atlas_labels(self, layout):
+        for item_id, field in self.get_label_fields().items():
+            self.get_layout_item(layout, item_id).setText(f'[% "{field}" %]')
+
+    def configure_atlas(self, layout, coverage):
+        atlas = layout.atlas()
+        atlas.setCoverageLayer(coverage)
+        atlas.setHideCoverage(True)
+        atlas.setSortFeatures(True)
+        atlas.setSortExpression('"page"')
+        atlas.setFilenameExpression('lpad(to_string("page"), 5, \'0\')')
+        atlas.setEnabled(True)
+        funcs = [
+            self.configure_atlas_maps,
+            self.configure_atlas_picture,
+            self.configure_atlas_table,
+            self.configure_atlas_labels,
+                ]
+        for f in funcs:
+            try:
+                f(layout)
+            except Exception as e:
+                self.logger.log_error(f'ERROR on {f.__name__}: {e}')
+
+    def get_atlas_filters(self):
+        # sign is drawn only on its own atlas page
+        id_field = QgsExpression.quotedColumnRef(self.id_field)
+        return {
+            layer: f"attribute(@atlas_feature, 'layer_id') = {QgsExpression.quotedValue(layer.id())} "
+                   f"AND {id_field} = attribute(@atlas_feature, 'feature_id')"
+            for layer in self.layers
+            }
+
+    def export_atlas(self, merged=True):
+        # all pages in one exporter session, one pdf for the book or one per page
+        self.generate_id()
+        export_folder = self.generate_export_folder()
+        layout = self.load_reference_layout()
+        self.coverage_layer = self.build_coverage_layer(layout)
+        self.configure_atlas(layout, self.coverage_layer)
+        self.turn_on_all_features()
+        settings = self.get_pdf_settings()
+        try:
+            self.set_page_filters(self.get_atlas_filters())
+            if merged:
+                filepath = export_folder / 'atlas.pdf'
+                status, error = QgsLayoutExporter.exportToPdf(layout.atlas(), str(filepath), settings)
+            else:
+                filepath = export_folder
+                status, error = QgsLayoutExporter.exportToPdfs(layout.atlas(), str(export_folder / 'page'), settings)
+        finally:
+            self.restore_page_filters()
+        if status != QgsLayoutExporter.Success:
+            raise Exception(f'Atlas export failed: {error}')
+        self.logger.log_info(f'Atlas saved to {filepath}')
+        return export_folder
+
+    def export_layouts_by_names(self, layout_names, del_layout=False, workers=0, pages_per_worker=0):
         layouts = [self.lay_mng.layoutByName(i) for i in layout_names]
-        return self.export_layouts(layouts, del_layout=del_layout)
+        return self.export_layouts(layouts, del_layout, workers, pages_per_worker)
     
-    def export_layouts(self, layouts, del_layout=False):
-        self.turn_off_all_features()
+    def export_layouts(self, layouts, del_layout=False, workers=0, pages_per_worker=0):
+        if workers > 1 and len(layouts) > 1:
+            self.export_layouts_parallel(layouts, workers, pages_per_worker, del_layout)
+        else:
+            self.export_layouts_serial(layouts, del_layout)
+        del self.logger
+
+    def get_page_plan(self, layouts):
+        plan = []
         for layout in layouts:
-            if self.feedback.isCanceled():
-                break
+            layout_scope = layout.createExpressionContext()
+            layer_id = layout_scope.variable('export_layer_id')
+            feature_id = layout_scope.variable('export_feature_id')
+            page = layout_scope.variable('export_page')
+            folder = layout_scope.variable('export_folder')
+            if not layer_id or not feature_id or not page:
+                self.logger.log_error(f"Can't find custom property for layer or feature in {layout.name()}")
             else:
-                layout_scope = layout.createExpressionContext()
-                layer_id = layout_scope.variable('export_layer_id')
-                feature_id = layout_scope.variable('export_feature_id')
-                page = layout_scope.variable('export_page')
-                folder = layout_scope.variable('export_folder')
-                if not layer_id or not feature_id or not page:
-                    self.logger.log_error("Can't find custom property for layer or feature")
+                plan.append((layout.name(), layer_id, feature_id, int(page), folder))
+        return plan
+
+    def export_layouts_parallel(self, layouts, workers, pages_per_worker, del_layout=False):
+        # every worker reads the saved project, so filters of one page never reach another process
+        plan = self.get_page_plan(layouts)
+        project_path = self.project.absoluteFilePath()
+        if not project_path:
+            raise Exception('Project must be saved before parallel export')
+        self.logger.log_info(f'Parallel export: {len(plan)} pages, {workers} processes')
+        context = multiprocessing.get_context('spawn')
+        context.set_executable(utils.get_python_executable())
+        initargs = (QgsApplication.prefixPath(), project_path, [i.id() for i in self.layers], self.id_field)
+        exported = []
+        with context.Pool(workers, initializer=init_export_worker, initargs=initargs,
+                          maxtasksperchild=pages_per_worker or None) as pool:
+            for i, (layout_name, filepath, error) in enumerate(pool.imap_unordered(export_page, plan)):
+                if self.feedback.isCanceled():
+                    break
+                if error and error.startswith(EXPORT_INIT_ERROR):
+                    # every process fails the same way
+                    self.logger.log_error(error)
+                    break
+                elif error:
+                    self.logger.log_error(f'Export of {layout_name} failed: {error}')
                 else:
-                    self.logger.log_info(f'Export layout: layer_id = {layer_id}, feature_id = {feature_id}')
-                    layer = self.project.mapLayer(layer_id)
-                    layer.setSubsetString('{}={}'.format(self.id_field, feature_id))
-                    self.export(folder, layout, page)
-                    if del_layout:
-                        self.remove_layout(layout)
-                        utils.save_project()
-                    layer.setSubsetString('{}=-1'.format(self.id_field))
+                    self.logger.log_info(f'File {filepath} saved')
+                    exported.append(layout_name)
+                self.feedback.setProgress(int((i + 1) / len(plan) * 100))
+        if del_layout and exported:
+            for layout_name in exported:
+                self.remove_layout(self.lay_mng.layoutByName(layout_name))
+            utils.save_project()
+
+    def export_layouts_serial(self, layouts, del_layout=False):
+        # page feature is chosen by layout variables, so layers are filtered once for all layouts
         self.turn_on_all_features()
-        del self.logger
+        exported = []
+        try:
+            self.set_page_filters(self.get_layout_filters())
+            for layout in layouts:
+                if self.feedback.isCanceled():
+                    break
+                else:
+                    layout_scope = layout.createExpressionContext()
+                    layer_id = layout_scope.variable('export_layer_id')
+                    feature_id = layout_scope.variable('export_feature_id')
+                    page = layout_scope.variable('export_page')
+                    folder = layout_scope.variable('export_folder')
+                    if not layer_id or not feature_id or not page:
+                        self.logger.log_error("Can't find custom property for layer or feature")
+                    else:
+                        self.logger.log_info(f'Export layout: layer_id = {layer_id}, feature_id = {feature_id}')
+                        self.export(folder, layout, page)
+                        exported.append(layout)
+        finally:
+            self.restore_page_filters()
+        # project is saved with original styles only
+        if del_layout and exported:
+            for layout in exported:
+                self.remove_layout(layout)
+            utils.save_project()
+
+
+### PAGE FILTERS ###
+
+def get_layout_filter(layer, id_field):
+    # feature of the page is taken from variables of the rendered layout
+    return (f'@export_layer_id = {QgsExpression.quotedValue(layer.id())} '
+            f'AND {QgsExpression.quotedColumnRef(id_field)} = @export_feature_id')
+
+
+def set_layer_filter(layer, expression):
+    # renderer and labels are wrapped into a rule with the expression, data provider stays untouched;
+    # returns original (renderer, labeling)
+    renderer = QgsRuleBasedRenderer.convertFromRenderer(layer.renderer())
+    if renderer is None:
+        raise Exception(f'Cant filter renderer of layer {layer.name()}')
+    root = renderer.rootRule()
+    page_rule = QgsRuleBasedRenderer.Rule(None, filterExp=expression)
+    for rule in list(root.children()):
+        page_rule.appendChild(root.takeChild(rule))
+    root.appendChild(page_rule)
+    original_renderer = layer.renderer().clone()
+    original_labeling = layer.labeling().clone() if layer.labeling() else None
+    # everything is built before the layer is touched, so a failure leaves it as it was
+    labeling = None
+    if original_labeling is not None and layer.labelsEnabled():
+        labeling = filter_labeling(original_labeling, expression)
+    layer.setRenderer(renderer)
+    if labeling is not None:
+        layer.setLabeling(labeling)
+    return original_renderer, original_labeling
+
+
+def filter_labeling(labeling, expression):
+    if isinstance(labeling, QgsRuleBasedLabeling):
+        root = labeling.rootRule().clone()
+    else:
+        root = QgsRuleBasedLabeling.Rule(None)
+        root.appendChild(QgsRuleBasedLabeling.Rule(QgsPalLayerSettings(labeling.settings())))
+    page_rule = QgsRuleBasedLabeling.Rule(None, filterExp=expression)
+    for rule in list(root.children()):
+        page_rule.appendChild(root.takeChild(rule))
+    root.appendChild(page_rule)
+    return QgsRuleBasedLabeling(root)
+
+
+def restore_layer_style(layer, renderer, labeling):
+    layer.setRenderer(renderer)
+    if labeling is not None:
+        layer.setLabeling(labeling)
+
+
+### PROCESS POOL WORKERS ###
+
+_export_worker = {}
+EXPORT_INIT_ERROR = 'Export process init failed'
+
+
+def init_export_worker(prefix_path, project_path, layer_ids, id_field):
+    # error of initializer would make pool restart the worker forever, so it is returned by every page instead
+    try:
+        start_export_worker(prefix_path, project_path, layer_ids, id_field)
+    except Exception as e:
+        _export_worker['error'] = f'{EXPORT_INIT_ERROR}: {e}'
+
+
+def start_export_worker(prefix_path, project_path, layer_ids, id_field):
+    # headless qgis with own copy of the project, which is never written back
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    QgsApplication.setPrefixPath(prefix_path, True)
+    app = QgsApplication([], False)
+    app.initQgis()
+    project = QgsProject.instance()
+    flags = QgsProject.ReadFlags()
+    if hasattr(QgsProject, 'FlagForceReadOnlyLayers'):
+        flags |= QgsProject.FlagForceReadOnlyLayers
+    if not project.read(project_path, flags):
+        raise Exception(f'Cant read project {project_path}')
+    for layer_id in layer_ids:
+        layer = project.mapLayer(layer_id)
+        if layer is not None:
+            if layer.subsetString():
+                layer.setSubsetString('')
+            set_layer_filter(layer, get_layout_filter(layer, id_field))
+    _export_worker.update(app=app, project=project, error=None)
+
+
+def export_page(task):
+    layout_name, layer_id, feature_id, page, folder = task
+    if _export_worker.get('error'):
+        return layout_name, None, _export_worker['error']
+    project = _export_worker['project']
+    layout = project.layoutManager().layoutByName(layout_name)
+    if layout is None:
+        return layout_name, None, f'Cant find layout {layout_name}'
+    filepath = Path(folder, '%05d.pdf' % page)
+    status = QgsLayoutExporter(layout).exportToPdf(str(filepath), PageGeneratorFramework.get_pdf_settings())
+    if status != QgsLayoutExporter.Success:
+        return layout_name, str(filepath), f'Export status {status}'
+    return layout_name, str(filepath), None
 
 
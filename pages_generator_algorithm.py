@@ -11,7 +11,8 @@ from qgis.core import (
     QgsProcessingParameterString,
     QgsProcessingParameterFile,
     QgsProcessingParameterDefinition,
-    QgsProcessingParameterBoolean
+    QgsProcessingParameterBoolean,
+    QgsProcessingParameterNumber,
     )
 from VeloRouteScripts import utils
 from VeloRouteScripts.pages_framework import PageGeneratorFramework
@@ -27,6 +28,8 @@ class PagesExporterAlgorithm(QgsProcessingAlgorithm):
     PARAM_EXPORT_LAYOUTS_ENUMS = 'PARAM_EXPORT_LAYOUTS'
     PARAM_EXPORT_LAYERS = 'PARAM_EXPORT_LAYERS'
     PARAM_DEL_LAYOUT = 'PARAM_DEL_LAYOUT'
+    PARAM_WORKERS = 'PARAM_WORKERS'
+    PARAM_PAGES_PER_WORKER = 'PARAM_PAGES_PER_WORKER'
 
     def initAlgorithm(self, config):
         self.layout_names = get_layout_names()
@@ -53,6 +56,18 @@ class PagesExporterAlgorithm(QgsProcessingAlgorithm):
                 defaultValue=False, 
             )
         )
+        advanced_params = []
+        advanced_params.append(QgsProcessingParameterNumber(self.PARAM_WORKERS,
+                                                   self.tr('Количество процессов экспорта (0 - последовательно)'),
+                                                   QgsProcessingParameterNumber.Integer,
+                                                   0, False, 0, 64))
+        advanced_params.append(QgsProcessingParameterNumber(self.PARAM_PAGES_PER_WORKER,
+                                                   self.tr('Листов на процесс до перезапуска (0 - без перезапуска)'),
+                                                   QgsProcessingParameterNumber.Integer,
+                                                   50, False, 0))
+        for p in advanced_params:
+            p.setFlags(p.flags() | QgsProcessingParameterDefinition.FlagAdvanced)
+            self.addParameter(p)
 
     def processAlgorithm(self, parameters, context, feedback):
         utils.save_project()
@@ -60,11 +75,13 @@ class PagesExporterAlgorithm(QgsProcessingAlgorithm):
         export_layers = self.parameterAsLayerList(parameters, self.PARAM_EXPORT_LAYERS, context)
         layout_enums = self.parameterAsEnums(parameters, self.PARAM_EXPORT_LAYOUTS_ENUMS, context)
         layout_names = [self.layout_names[i] for i in layout_enums]
+        workers = self.parameterAsInt(parameters, self.PARAM_WORKERS, context)
+        pages_per_worker = self.parameterAsInt(parameters, self.PARAM_PAGES_PER_WORKER, context)
         framework = PageGeneratorFramework(
             feedback,
             export_layers,
             )
-        framework.export_layouts_by_names(layout_names, del_layout)
+        framework.export_layouts_by_names(layout_names, del_layout, workers, pages_per_worker)
         return {}
 
     def name(self):
@@ -98,6 +115,11 @@ class PagesExporterAlgorithm(QgsProcessingAlgorithm):
                 '<li><b>Листы для экспорта</b> - выбираем созданные алгоритмом генерации листов макеты</li>'\
                 '<li><b>Слои для генерации</b> - здесь следует выбрать абсолютно все слои, которые не должны отображаться целиком на листе</li>'\
                 '<li><b>Удалять макет после экспорта</b> - при успешном экспорте макет будет удален из проекта</li>'\
+                '<li><b>Количество процессов экспорта</b> - если больше 1, листы экспортируются параллельно '\
+                'в отдельных процессах QGIS без интерфейса. Каждый процесс открывает сохраненный проект только для чтения '\
+                'и сам скрывает носители, поэтому QGIS не блокируется на время экспорта всех листов</li>'\
+                '<li><b>Листов на процесс до перезапуска</b> - после стольких листов процесс экспорта '\
+                'перезапускается, чтобы не накапливать память</li>'\
                 '</ul>'\
                 '<b>Результат</b><ul>'\
                 '<li>Создастся папка типа pdf/дата выгрузки, в которой будут созданы pdf файлы. Имена pdf файлов соответствуют их номеру</li>'\
@@ -116,6 +138,8 @@ class PagesGeneratorAlgorithm(QgsProcessingAlgorithm):
     PARAM_ITEM_COORDS_LABEL = 'PARAM_ITEM_COORDS_LABEL'
     PARAM_WF_TYPES_FOLDER = 'PARAM_WF_TYPES_FOLDER'
     PARAM_ITEM_ROUTE_LABEL = 'PARAM_ITEM_ROUTE_LABEL'
+    PARAM_EXPORT_MODE = 'PARAM_EXPORT_MODE'
+    EXPORT_MODES = ['Макеты в проекте', 'Сразу в PDF, макеты не создаются', 'Атлас: один PDF', 'Атлас: PDF на каждый лист']
 
     
     def initAlgorithm(self, config):
@@ -148,7 +172,9 @@ class PagesGeneratorAlgorithm(QgsProcessingAlgorithm):
                 self.PARAM_LAYOUT_NAME_ENUM, 
                 self.tr('Название шаблона макета'), 
                 options = self.layout_names,
-                defaultValue = 0,
+                # project without layouts has no options, the .qpt template is used then
+                defaultValue = 0 if self.layout_names else None,
+                optional = True,
                 )
             )
         self.addParameter(
@@ -159,6 +185,14 @@ class PagesGeneratorAlgorithm(QgsProcessingAlgorithm):
                 behavior = QgsProcessingParameterFile.Folder
                 )
             )
+        self.addParameter(
+            QgsProcessingParameterEnum(
+                self.PARAM_EXPORT_MODE,
+                self.tr('Режим'),
+                options = [self.tr(i) for i in self.EXPORT_MODES],
+                defaultValue = 0,
+                )
+            )
         advanced_params = []
         advanced_params.append(
             QgsProcessingParameterString(self.PARAM_ITEM_ID_PLACE_MAP,
@@ -213,8 +247,15 @@ class PagesGeneratorAlgorithm(QgsProcessingAlgorithm):
         logger.log_info('Analyze parameters')
         routecode_enums = self.parameterAsEnums(parameters, self.PARAM_ROUTECODE_ENUMS, context)
         routecodes = [self.route_codes[i] for i in routecode_enums]
-        layout_enum = self.parameterAsEnum(parameters, self.PARAM_LAYOUT_NAME_ENUM, context)
-        layout_name = self.layout_names[layout_enum]
+        layout_name = None
+        if parameters.get(self.PARAM_LAYOUT_NAME_ENUM) is not None:
+            layout_enum = self.parameterAsEnum(parameters, self.PARAM_LAYOUT_NAME_ENUM, context)
+            if 0 <= layout_enum < len(self.layout_names):
+                layout_name = self.layout_names[layout_enum]
+        export_mode = self.parameterAsEnum(parameters, self.PARAM_EXPORT_MODE, context)
+        if export_mode == 0 and layout_name is None:
+            # layouts in project are duplicated from the reference one, template is used only by modes without layouts
+            raise Exception(f'Mode "{self.EXPORT_MODES[0]}" needs a reference layout in the project, add one or choose another mode')
         export_layers = self.parameterAsLayerList(parameters, self.PARAM_EXPORT_LAYERS, context)
         wf_types_folder = self.parameterAsFile(parameters, self.PARAM_WF_TYPES_FOLDER, context)
         coords_label_id = self.parameterAsString(parameters, self.PARAM_ITEM_COORDS_LABEL, context)
@@ -241,7 +282,12 @@ class PagesGeneratorAlgorithm(QgsProcessingAlgorithm):
             wf_pic_id,
             )
         logger.log_info('Start framework')
-        layouts = framework.generate_layouts()
+        if export_mode == 1:
+            framework.stream_layouts()
+        elif export_mode in (2, 3):
+            framework.export_atlas(merged=export_mode == 2)
+        else:
+            layouts = framework.generate_layouts()
         return {}
 
     def name(self):
@@ -274,6 +320,13 @@ class PagesGeneratorAlgorithm(QgsProcessingAlgorithm):
                 '<li><b>Название шаблона макета</b> - на основании этого макета будут сгенерированы новые макеты</li>'\
                 '<li>Папка с картинками общих видов носителей - папка, в которой содержатся изображения с видами носителей. '\
                 'Ищется автоматически в папке проекта по содержанию в названии “wf”</li>'\
+                '<li><b>Режим</b> - <i>Макеты в проекте</i>: для каждого носителя создается макет, '\
+                'экспорт выполняется отдельным алгоритмом. <i>Сразу в PDF</i>: один экземпляр шаблона обновляется '\
+                'для каждого носителя и сразу экспортируется в pdf, макеты не добавляются в проект, проект не сохраняется. '\
+                '<i>Атлас</i>: страницы со всеми данными заранее собираются во временный слой покрытия, '\
+                'и шаблон экспортируется как атлас за один проход - в один файл atlas.pdf или в файл на каждый лист. '\
+                'В режимах без макетов, если шаблон не найден в проекте, используется layout_templates/layout_template.qpt из плагина; '\
+                'режим <i>Макеты в проекте</i> без макета-шаблона в проекте не запускается</li>'\
                 '<li><b>Перечень параметров ID</b> - в них зафиксированы id элементов макета, '\
                 'которые подлежат обновлению для каждого конкретного объекта. Для удобства '\
                 '(чтобы каждый раз не заполнять самостоятельно) рекомендуется сохранить дефолтные значения '\
@@ -0,0 +1,657 @@
+# -*- coding: utf-8 -*-
+# Routing graph and search algorithms without qgis dependencies
+import heapq
+from collections import OrderedDict
+import hashlib
+import os
+import shutil
+import tempfile
+from pathlib import Path
+from math import hypot, sin, cos, asin, sqrt, inf
+import numpy as np
+
+
+# smallest WGS84 curvature radius - spherical distance with it never overestimates the edge costs
+EARTH_RADIUS_LOWER_BOUND = 6335439
+# bump when stored arrays change their meaning
+GRAPH_CACHE_VERSION = b'3'
+
+
+class RoutingGraph:
+    # coords - lon/lat of vertices (EPSG:4326), edges are undirected
+    # edge_costs - (2d length, elevation delta, 3d length) for every edge id
+    ARRAY_NAMES = [
+        'coords', 'edge_from', 'edge_to', 'edge_costs', 'elevations', 
+        'offsets', 'neighbours', 'slot_edges', 'slot_costs',
+        ]
+
+    def __init__(self, coords, edge_from, edge_to, edge_costs, elevations, csr=None):
+        self.coords = np.asarray(coords, dtype=np.float64).reshape(-1, 2)
+        self.edge_from = np.asarray(edge_from, dtype=np.int32)
+        self.edge_to = np.asarray(edge_to, dtype=np.int32)
+        self.edge_costs = np.asarray(edge_costs, dtype=np.float32).reshape(-1, 3)
+        self.elevations = np.asarray(elevations, dtype=np.float32)
+        if csr is None:
+            self.build_csr()
+        else:
+            self.offsets, self.neighbours, self.slot_edges, self.slot_costs = csr
+        self._adjacency = None
+        self._heuristic_lists = None
+        self._slot_lengths = None
+        self._slot_sources = None
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        csr = [arrays[i] for i in ('offsets', 'neighbours', 'slot_edges', 'slot_costs')]
+        return cls(
+            arrays['coords'], 
+            arrays['edge_from'], 
+            arrays['edge_to'], 
+            arrays['edge_costs'], 
+            arrays['elevations'], 
+            csr,
+            )
+
+    def to_arrays(self):
+        return {i: getattr(self, i) for i in self.ARRAY_NAMES}
+
+    @property
+    def vertex_count(self):
+        return len(self.coords)
+
+    @property
+    def edge_count(self):
+        return len(self.edge_from)
+
+    def build_csr(self):
+        edge_ids = np.arange(self.edge_count, dtype=np.int32)
+        sources = np.concatenate([self.edge_from, self.edge_to])
+        targets = np.concatenate([self.edge_to, self.edge_from])
+        order = np.argsort(sources, kind='stable')
+        self.neighbours = targets[order].astype(np.int32)
+        self.slot_edges = np.concatenate([edge_ids, edge_ids])[order]
+        self.offsets = np.zeros(self.vertex_count + 1, dtype=np.int32)
+        np.cumsum(np.bincount(sources, minlength=self.vertex_count), out=self.offsets[1:])
+        self.slot_costs = self.edge_costs[self.slot_edges, 2]
+
+    def adjacency(self):
+        # plain lists are much faster than numpy scalars inside python loops
+        if self._adjacency is None:
+            self._adjacency = (
+                self.offsets.tolist(),
+                self.neighbours.tolist(),
+                self.slot_costs.tolist(),
+                )
+        return self._adjacency
+
+    def slot_lengths(self):
+        # 2d lengths of adjacency slots, search itself runs on 3d costs
+        if self._slot_lengths is None:
+            self._slot_lengths = self.edge_costs[self.slot_edges, 0].tolist()
+        return self._slot_lengths
+
+    def slot_sources(self):
+        # vertex every adjacency slot goes from, searches keep slots to restore paths and their edges
+        if self._slot_sources is None:
+            self._slot_sources = np.repeat(
+                np.arange(self.vertex_count, dtype=np.int32), 
+                np.diff(self.offsets),
+                ).tolist()
+        return self._slot_sources
+
+    def heuristic_lists(self):
+        if self._heuristic_lists is None:
+            self._heuristic_lists = (
+                np.radians(self.coords[:, 0]).tolist(),
+                np.radians(self.coords[:, 1]).tolist(),
+                self.elevations.tolist(),
+                )
+        return self._heuristic_lists
+
+    def path_slots(self, vertex_ids):
+        # cheapest slot between every pair of path vertices, for paths restored without slots
+        offsets, neighbours, costs = self.adjacency()
+        slots = []
+        for from_vertex_id, to_vertex_id in zip(vertex_ids, vertex_ids[1:]):
+            best_slot = -1
+            for slot in range(offsets[from_vertex_id], offsets[from_vertex_id + 1]):
+                if neighbours[slot] == to_vertex_id and (best_slot == -1 or costs[slot] < costs[best_slot]):
+                    best_slot = slot
+            if best_slot == -1:
+                raise Exception(f'No edge between vertices {from_vertex_id} and {to_vertex_id}')
+            slots.append(best_slot)
+        return slots
+
+    def slots_lengths(self, slots):
+        # (2d length, 3d length) of a path given by its adjacency slots
+        lengths = self.slot_lengths()
+        costs = self.adjacency()[2]
+        return sum(lengths[i] for i in slots), sum(costs[i] for i in slots)
+
+    def slots_edges(self, slots):
+        return self.slot_edges[np.asarray(slots, dtype=np.int64)].tolist()
+
+    def path_lengths(self, vertex_ids):
+        return self.slots_lengths(self.path_slots(vertex_ids))
+
+
+def graph_cache_key(*parts):
+    digest = hashlib.sha1(GRAPH_CACHE_VERSION)
+    for part in parts:
+        digest.update(hashlib.sha1(part).digest())
+    return digest.hexdigest()
+
+
+def edge_keys(coords, edge_from, edge_to):
+    # keys of undirected edges by rounded end coordinates, equal between graph builds
+    ints = np.round(np.asarray(coords, dtype=np.float64).reshape(-1, 2) * 1e7).astype(np.int64).view(np.uint64)
+    from_keys = _mix_keys(ints[edge_from, 0], ints[edge_from, 1])
+    to_keys = _mix_keys(ints[edge_to, 0], ints[edge_to, 1])
+    keys = _mix_keys(np.minimum(from_keys, to_keys), np.maximum(from_keys, to_keys))
+    # non negative, -1 is left for edges without road origin
+    return (keys >> np.uint64(1)).astype(np.int64)
+
+
+def _mix_keys(a, b):
+    with np.errstate(over='ignore'):
+        h = a * np.uint64(0x9E3779B97F4A7C15) ^ b
+        h ^= h >> np.uint64(31)
+        h *= np.uint64(0xBF58476D1CE4E5B9)
+        h ^= h >> np.uint64(29)
+    return h
+
+
+def spherical_distances(lon, lat, lons, lats, radius=EARTH_RADIUS_LOWER_BOUND):
+    # lower bounds of distances from (lon, lat) to every point, degrees
+    lon, lat = np.radians(lon), np.radians(lat)
+    lons, lats = np.radians(lons), np.radians(lats)
+    a = np.sin((lats - lat) / 2) ** 2 + np.cos(lat) * np.cos(lats) * np.sin((lons - lon) / 2) ** 2
+    return 2 * radius * np.arcsin(np.minimum(1.0, np.sqrt(a)))
+
+
+class SegmentGrid:
+    # uniform grid over edge bounding boxes, nearest edge for many points is found
+    # by scanning rings of cells around every point
+    def __init__(self, coords, edge_from, edge_to, cell_size=None):
+        coords = np.asarray(coords, dtype=np.float64).reshape(-1, 2)
+        self.x1, self.y1 = coords[edge_from, 0], coords[edge_from, 1]
+        self.x2, self.y2 = coords[edge_to, 0], coords[edge_to, 1]
+        self.edge_count = len(self.x1)
+        if not self.edge_count:
+            return
+        xmin = np.minimum(self.x1, self.x2)
+        ymin = np.minimum(self.y1, self.y2)
+        xmax = np.maximum(self.x1, self.x2)
+        ymax = np.maximum(self.y1, self.y2)
+        self.xmin, self.ymin = xmin.min(), ymin.min()
+        width, height = xmax.max() - self.xmin, ymax.max() - self.ymin
+        if cell_size is None:
+            # about one edge per cell, but not smaller than a typical edge
+            cell_size = max(max(width, height) / np.sqrt(self.edge_count), np.mean(np.maximum(xmax - xmin, ymax - ymin)))
+        self.cell_size = cell_size if cell_size > 0 else 1.0
+        self.cols = int(width // self.cell_size) + 1
+        self.rows = int(height // self.cell_size) + 1
+        cx0, cx1 = self.cell_x(xmin), self.cell_x(xmax)
+        cy0, cy1 = self.cell_y(ymin), self.cell_y(ymax)
+        # every edge is registered in all cells of its bounding box
+        nx, ny = cx1 - cx0 + 1, cy1 - cy0 + 1
+        counts = nx * ny
+        edge_ids = np.repeat(np.arange(self.edge_count), counts)
+        local = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        cells = (cy0[edge_ids] + local // nx[edge_ids]) * self.cols + cx0[edge_ids] + local % nx[edge_ids]
+        order = np.argsort(cells, kind='stable')
+        self.cell_edges = edge_ids[order]
+        self.cell_offsets = np.concatenate([[0], np.cumsum(np.bincount(cells, minlength=self.cols * self.rows))])
+
+    def cell_x(self, xs):
+        return np.clip(((xs - self.xmin) // self.cell_size).astype(np.int64), 0, self.cols - 1)
+
+    def cell_y(self, ys):
+        return np.clip(((ys - self.ymin) // self.cell_size).astype(np.int64), 0, self.rows - 1)
+
+    def ring_edges(self, cx, cy, radius):
+        if radius == 0:
+            xs, ys = np.array([cx]), np.array([cy])
+        else:
+            side = np.arange(-radius, radius + 1)
+            xs = np.concatenate([cx + side, cx + side, np.full(2 * radius - 1, cx - radius), np.full(2 * radius - 1, cx + radius)])
+            ys = np.concatenate([np.full(2 * radius + 1, cy - radius), np.full(2 * radius + 1, cy + radius), cy + side[1:-1], cy + side[1:-1]])
+        inside = (xs >= 0) & (xs < self.cols) & (ys >= 0) & (ys < self.rows)
+        cells = ys[inside] * self.cols + xs[inside]
+        parts = [self.cell_edges[self.cell_offsets[i]:self.cell_offsets[i + 1]] for i in cells.tolist()]
+        return np.concatenate(parts) if parts else np.empty(0, dtype=np.int64)
+
+    def project(self, edge_ids, x, y):
+        # planar projection in graph crs as QgsVectorLayerDirector does
+        x1, y1, x2, y2 = self.x1[edge_ids], self.y1[edge_ids], self.x2[edge_ids], self.y2[edge_ids]
+        dx, dy = x2 - x1, y2 - y1
+        length2 = dx * dx + dy * dy
+        t = np.where(length2 > 0, ((x - x1) * dx + (y - y1) * dy) / np.where(length2 > 0, length2, 1), 0.0)
+        t = np.clip(t, 0.0, 1.0)
+        return np.hypot(x1 + dx * t - x, y1 + dy * t - y), t
+
+    def nearest(self, xs, ys):
+        # (edge ids, positions on edges 0..1, distances) of the nearest edges, edge id -1 if there are no edges
+        count = len(xs)
+        result_edges = np.full(count, -1, dtype=np.int64)
+        result_ts = np.zeros(count, dtype=np.float64)
+        result_distances = np.full(count, inf, dtype=np.float64)
+        if not self.edge_count:
+            return result_edges, result_ts, result_distances
+        # points outside of the grid start from the nearest border cell
+        cxs, cys = self.cell_x(np.asarray(xs)), self.cell_y(np.asarray(ys))
+        max_radius = max(self.cols, self.rows)
+        for i, (x, y, cx, cy) in enumerate(zip(xs, ys, cxs.tolist(), cys.tolist())):
+            outside = max(
+                self.xmin - x, x - (self.xmin + self.cols * self.cell_size),
+                self.ymin - y, y - (self.ymin + self.rows * self.cell_size),
+                0.0,
+                )
+            best = (inf, -1, 0.0)
+            for radius in range(max_radius + 1):
+                edge_ids = np.unique(self.ring_edges(cx, cy, radius))
+                if len(edge_ids):
+                    distances, ts = self.project(edge_ids, x, y)
+                    j = int(np.argmin(distances))
+                    if (distances[j], edge_ids[j]) < best[:2]:
+                        best = (distances[j], int(edge_ids[j]), float(ts[j]))
+                # cells behind the ring are not closer than radius cells
+                if best[0] <= max(outside, radius * self.cell_size):
+                    break
+            result_distances[i], result_edges[i], result_ts[i] = best
+        return result_edges, result_ts, result_distances
+
+
+class GraphCache:
+    # every entry is a folder with one .npy file per array, so it can be memory-mapped
+    def __init__(self, folder):
+        self.folder = Path(folder)
+        self.error = None
+
+    def entry_folder(self, kind, key):
+        return self.folder / f'{kind}_{key}'
+
+    def load(self, kind, key, mmap_mode='r'):
+        folder = self.entry_folder(kind, key)
+        if not folder.is_dir():
+            return None
+        return {i.stem: np.load(str(i), mmap_mode=mmap_mode) for i in folder.glob('*.npy')}
+
+    def save(self, kind, key, arrays):
+        # write into temp folder first, readers never see a half-written entry;
+        # returns None if the entry can't be written, the reason is kept in self.error
+        self.error = None
+        self.folder.mkdir(parents=True, exist_ok=True)
+        self.remove_trash()
+        folder = self.entry_folder(kind, key)
+        tmp_folder = Path(tempfile.mkdtemp(prefix='tmp_', dir=str(self.folder)))
+        try:
+            for name, array in arrays.items():
+                np.save(str(tmp_folder / f'{name}.npy'), np.asarray(array))
+            os.replace(str(tmp_folder), str(folder))
+        except OSError as e:
+            shutil.rmtree(str(tmp_folder), ignore_errors=True)
+            if folder.is_dir():
+                # the same entry was written by another process meanwhile
+                return folder
+            self.error = f'{folder.name}: {e}'
+            return None
+        self.prune(kind, folder)
+        return folder
+
+    def prune(self, kind, keep_folder):
+        # old entries are moved away whole, an entry that is still memory-mapped somewhere stays untouched
+        for old_folder in self.folder.glob(f'{kind}_*'):
+            if old_folder == keep_folder:
+                continue
+            trash_folder = Path(tempfile.mkdtemp(prefix='trash_', dir=str(self.folder)))
+            try:
+                os.replace(str(old_folder), str(trash_folder / old_folder.name))
+            except OSError:
+                pass
+        self.remove_trash()
+
+    def remove_trash(self):
+        for trash_folder in self.folder.glob('trash_*'):
+            shutil.rmtree(str(trash_folder), ignore_errors=True)
+
+
+class PathTree:
+    # came_from holds the adjacency slot every vertex was reached by, -1 for the root
+    def __init__(self, root_vertex_id, cost_so_far, came_from, settled, expanded, slot_sources):
+        self.root_vertex_id = root_vertex_id
+        self.cost_so_far = cost_so_far
+        self.came_from = came_from
+        self.settled = settled
+        self.expanded = expanded
+        self.slot_sources = slot_sources
+
+    def path_to(self, vertex_id):
+        path = self.path_with_slots(vertex_id)
+        return path[0] if path else None
+
+    def path_with_slots(self, vertex_id):
+        # (vertex ids from vertex_id to root, their slots), only settled vertices have final shortest paths
+        self.check_vertex(vertex_id)
+        if not self.settled[vertex_id]:
+            return None
+        return unpack_slots(self.came_from, self.slot_sources, vertex_id)
+
+    def distance_to(self, vertex_id):
+        self.check_vertex(vertex_id)
+        if not self.settled[vertex_id]:
+            return None
+        return self.cost_so_far[vertex_id]
+
+    def check_vertex(self, vertex_id):
+        # -1 of a point missing on graph would silently index the last vertex
+        if not 0 <= vertex_id < len(self.settled):
+            raise Exception(f'Vertex {vertex_id} is not on graph')
+
+
+class PathCache:
+    # LRU cache of (vertex ids from finish to start, 2d length, 3d length, edge ids)
+    def __init__(self, max_size=10000, symmetric=True):
+        self.max_size = max_size
+        self.symmetric = symmetric
+        self.items = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, start_vertex_id, finish_vertex_id):
+        key = (start_vertex_id, finish_vertex_id)
+        if key in self.items:
+            self.items.move_to_end(key)
+            self.hits += 1
+            return self.items[key]
+        if self.symmetric and (finish_vertex_id, start_vertex_id) in self.items:
+            # undirected network - reversed path is the shortest one too
+            vertex_ids, l2d, l3d, edge_ids = self.items[finish_vertex_id, start_vertex_id]
+            self.hits += 1
+            return self.put(start_vertex_id, finish_vertex_id, vertex_ids[::-1], l2d, l3d, edge_ids[::-1])
+        self.misses += 1
+        return None
+
+    def put(self, start_vertex_id, finish_vertex_id, vertex_ids, l2d, l3d, edge_ids):
+        value = (vertex_ids, l2d, l3d, edge_ids)
+        if self.max_size <= 0:
+            return value
+        key = (start_vertex_id, finish_vertex_id)
+        self.items[key] = value
+        self.items.move_to_end(key)
+        while len(self.items) > self.max_size:
+            self.items.popitem(last=False)
+        return value
+
+    def stats(self):
+        total = self.hits + self.misses
+        ratio = self.hits / total * 100 if total else 0
+        return f'{self.hits} hits, {self.misses} misses ({ratio:.1f}% hit rate), {len(self.items)} paths stored'
+
+
+def unpack_slots(came_from, slot_sources, vertex_id):
+    vertex_ids_path = [vertex_id]
+    slots = []
+    slot = came_from[vertex_id]
+    while slot != -1:
+        slots.append(slot)
+        vertex_ids_path.append(slot_sources[slot])
+        slot = came_from[vertex_ids_path[-1]]
+    return vertex_ids_path, slots
+
+
+def spherical_heuristic(graph, finish_vertex_id, radius=EARTH_RADIUS_LOWER_BOUND):
+    lons, lats, elevations = graph.heuristic_lists()
+    lon2, lat2, h2 = lons[finish_vertex_id], lats[finish_vertex_id], elevations[finish_vertex_id]
+    cos_lat2 = cos(lat2)
+    def heuristic(vertex_id):
+        lat1 = lats[vertex_id]
+        a = sin((lat2 - lat1) / 2) ** 2 + cos(lat1) * cos_lat2 * sin((lon2 - lons[vertex_id]) / 2) ** 2
+        return hypot(2 * radius * asin(min(1.0, sqrt(a))), elevations[vertex_id] - h2)
+    return heuristic
+
+
+def dijkstra(graph, start_vertex_id, targets=None, cutoff=None):
+    # expands until all targets are settled (whole graph if targets is None)
+    offsets, neighbours, costs = graph.adjacency()
+    n = graph.vertex_count
+    cost_so_far = [inf] * n
+    came_from = [-1] * n
+    settled = bytearray(n)
+    remaining = None if targets is None else set(targets)
+    cost_so_far[start_vertex_id] = 0.0
+    frontier = [(0.0, start_vertex_id)]
+    expanded = 0
+    while frontier:
+        if remaining is not None and not remaining:
+            break
+        cost, current = heapq.heappop(frontier)
+        if settled[current]:
+            continue
+        if cutoff is not None and cost > cutoff:
+            break
+        settled[current] = 1
+        expanded += 1
+        if remaining is not None:
+            remaining.discard(current)
+        for slot in range(offsets[current], offsets[current + 1]):
+            next_vertex_id = neighbours[slot]
+            new_cost = cost + costs[slot]
+            if new_cost < cost_so_far[next_vertex_id]:
+                cost_so_far[next_vertex_id] = new_cost
+                came_from[next_vertex_id] = slot
+                heapq.heappush(frontier, (new_cost, next_vertex_id))
+    return PathTree(start_vertex_id, cost_so_far, came_from, settled, expanded, graph.slot_sources())
+
+
+def astar(graph, start_vertex_id, finish_vertex_id, heuristic):
+    # returns (vertex ids from finish to start or None, their slots or None, expanded vertex count)
+    offsets, neighbours, costs = graph.adjacency()
+    n = graph.vertex_count
+    cost_so_far = [inf] * n
+    came_from = [-1] * n
+    settled = bytearray(n)
+    cost_so_far[start_vertex_id] = 0.0
+    frontier = [(heuristic(start_vertex_id), start_vertex_id)]
+    expanded = 0
+    while frontier:
+        _, current = heapq.heappop(frontier)
+        if settled[current]:
+            continue
+        settled[current] = 1
+        expanded += 1
+        if current == finish_vertex_id:
+            break
+        cost = cost_so_far[current]
+        for slot in range(offsets[current], offsets[current + 1]):
+            next_vertex_id = neighbours[slot]
+            new_cost = cost + costs[slot]
+            if new_cost < cost_so_far[next_vertex_id]:
+                cost_so_far[next_vertex_id] = new_cost
+                came_from[next_vertex_id] = slot
+                heapq.heappush(frontier, (new_cost + heuristic(next_vertex_id), next_vertex_id))
+    tree = PathTree(start_vertex_id, cost_so_far, came_from, settled, expanded, graph.slot_sources())
+    vertex_ids_path, slots = tree.path_with_slots(finish_vertex_id) or (None, None)
+    return vertex_ids_path, slots, expanded
+
+
+def bidirectional_astar(graph, start_vertex_id, finish_vertex_id, to_finish_bound, to_start_bound):
+    # average potentials keep both searches consistent (Ikeda et al.), so they may stop at the first
+    # moment when top keys sum reaches the best meeting distance;
+    # returns (vertex ids from finish to start or None, their slots or None, expanded vertex count)
+    offsets, neighbours, costs = graph.adjacency()
+    n = graph.vertex_count
+    potential = lambda v: (to_finish_bound(v) - to_start_bound(v)) / 2
+    cost_so_far = ([inf] * n, [inf] * n)
+    came_from = ([-1] * n, [-1] * n)
+    settled = (bytearray(n), bytearray(n))
+    signs = (1, -1)
+    cost_so_far[0][start_vertex_id] = 0.0
+    cost_so_far[1][finish_vertex_id] = 0.0
+    frontiers = (
+        [(potential(start_vertex_id), start_vertex_id)],
+        [(-potential(finish_vertex_id), finish_vertex_id)],
+        )
+    best_cost = inf
+    meeting_vertex_id = -1
+    expanded = 0
+    while frontiers[0] and frontiers[1]:
+        if frontiers[0][0][0] + frontiers[1][0][0] >= best_cost:
+            break
+        side = 0 if frontiers[0][0][0] <= frontiers[1][0][0] else 1
+        _, current = heapq.heappop(frontiers[side])
+        if settled[side][current]:
+            continue
+        settled[side][current] = 1
+        expanded += 1
+        cost = cost_so_far[side][current]
+        other_cost_so_far = cost_so_far[1 - side]
+        for slot in range(offsets[current], offsets[current + 1]):
+            next_vertex_id = neighbours[slot]
+            new_cost = cost + costs[slot]
+            if new_cost < cost_so_far[side][next_vertex_id]:
+                cost_so_far[side][next_vertex_id] = new_cost
+                came_from[side][next_vertex_id] = slot
+                key = new_cost + signs[side] * potential(next_vertex_id)
+                heapq.heappush(frontiers[side], (key, next_vertex_id))
+                total = new_cost + other_cost_so_far[next_vertex_id]
+                if total < best_cost:
+                    best_cost = total
+                    meeting_vertex_id = next_vertex_id
+    if start_vertex_id == finish_vertex_id:
+        return [start_vertex_id], [], expanded
+    if meeting_vertex_id == -1:
+        return None, None, expanded
+    # vertex ids from finish to start, as other searches return; a slot of the backward search
+    # goes against the path, but it stands for the same edge
+    slot_sources = graph.slot_sources()
+    to_start, to_start_slots = unpack_slots(came_from[0], slot_sources, meeting_vertex_id)
+    to_finish, to_finish_slots = unpack_slots(came_from[1], slot_sources, meeting_vertex_id)
+    return to_finish[::-1] + to_start[1:], to_finish_slots[::-1] + to_start_slots, expanded
+
+
+class Landmarks:
+    # ALT preprocessing: exact network distances from a few landmarks to every vertex
+    def __init__(self, vertex_ids, distances):
+        self.vertex_ids = np.asarray(vertex_ids, dtype=np.int32)
+        self.distances = np.asarray(distances, dtype=np.float32).reshape(len(self.vertex_ids), -1)
+        self._lists = None
+
+    @classmethod
+    def select(cls, graph, count, seed_vertex_id=0):
+        # farthest landmark selection, every next landmark is the vertex farthest from chosen ones
+        if graph.vertex_count == 0 or count <= 0:
+            return cls([], np.empty((0, graph.vertex_count)))
+        vertex_ids = []
+        distances = []
+        min_distance = np.asarray(dijkstra(graph, seed_vertex_id).cost_so_far)
+        for _ in range(count):
+            reachable = np.isfinite(min_distance)
+            if not reachable.any():
+                break
+            candidates = np.where(reachable, min_distance, -1)
+            if vertex_ids:
+                candidates[vertex_ids] = -1
+            vertex_id = int(np.argmax(candidates))
+            if candidates[vertex_id] < 0:
+                break
+            vertex_distance = np.asarray(dijkstra(graph, vertex_id).cost_so_far)
+            vertex_ids.append(vertex_id)
+            distances.append(vertex_distance)
+            min_distance = vertex_distance if len(vertex_ids) == 1 else np.minimum(min_distance, vertex_distance)
+        return cls(vertex_ids, np.array(distances, dtype=np.float32).reshape(len(vertex_ids), graph.vertex_count))
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        return cls(arrays['landmark_ids'], arrays['landmark_distances'])
+
+    def to_arrays(self):
+        return {'landmark_ids': self.vertex_ids, 'landmark_distances': self.distances}
+
+    def heuristic(self, graph, finish_vertex_id):
+        # triangle inequality |d(L, v) - d(L, t)| on undirected network, never worse than spherical bound
+        if self._lists is None:
+            self._lists = [i.tolist() for i in self.distances]
+        spherical = spherical_heuristic(graph, finish_vertex_id)
+        pairs = [(i, i[finish_vertex_id]) for i in self._lists if i[finish_vertex_id] != inf]
+        def heuristic(vertex_id):
+            bound = spherical(vertex_id)
+            for distances, finish_distance in pairs:
+                landmark_bound = abs(distances[vertex_id] - finish_distance)
+                if landmark_bound > bound:
+                    bound = landmark_bound
+            return bound
+        return heuristic
+
+
+def sign_paths(graph, start_vertex_id, targets):
+    # one expansion for all targets of a sign:
+    # ({(start, finish): (vertex ids, 2d length, 3d length, edge ids)}, expanded vertex count)
+    tree = dijkstra(graph, start_vertex_id, targets)
+    result = {}
+    for finish_vertex_id in targets:
+        path = tree.path_with_slots(finish_vertex_id)
+        if path:
+            vertex_ids_path, slots = path
+            l2d, l3d = graph.slots_lengths(slots)
+            result[start_vertex_id, finish_vertex_id] = (vertex_ids_path, l2d, l3d, graph.slots_edges(slots))
+    return result, tree.expanded
+
+
+def distance_row(graph, start_vertex_id, targets, cutoff=None):
+    # one expansion for many targets: (2d lengths, 3d lengths) aligned with targets, nan if not reached
+    # within cutoff; 2d length is summed along the shortest 3d path
+    offsets, neighbours, costs = graph.adjacency()
+    lengths = graph.slot_lengths()
+    n = graph.vertex_count
+    cost_so_far = [inf] * n
+    length_so_far = [0.0] * n
+    settled = bytearray(n)
+    remaining = set(targets)
+    cost_so_far[start_vertex_id] = 0.0
+    frontier = [(0.0, start_vertex_id)]
+    while frontier and remaining:
+        cost, current = heapq.heappop(frontier)
+        if settled[current]:
+            continue
+        if cutoff is not None and cost > cutoff:
+            break
+        settled[current] = 1
+        remaining.discard(current)
+        length = length_so_far[current]
+        for slot in range(offsets[current], offsets[current + 1]):
+            next_vertex_id = neighbours[slot]
+            new_cost = cost + costs[slot]
+            if new_cost < cost_so_far[next_vertex_id]:
+                cost_so_far[next_vertex_id] = new_cost
+                length_so_far[next_vertex_id] = length + lengths[slot]
+                heapq.heappush(frontier, (new_cost, next_vertex_id))
+    lengths_2d = np.full(len(targets), np.nan)
+    lengths_3d = np.full(len(targets), np.nan)
+    for i, vertex_id in enumerate(targets):
+        if settled[vertex_id]:
+            lengths_2d[i] = length_so_far[vertex_id]
+            lengths_3d[i] = cost_so_far[vertex_id]
+    return lengths_2d, lengths_3d
+
+
+### PROCESS POOL WORKERS ###
+
+_worker_graph = None
+
+
+def init_search_worker(graph_folder):
+    # arrays are memory-mapped read-only, so all workers share the page cache of one file set
+    global _worker_graph
+    arrays = {i.stem: np.load(str(i), mmap_mode='r') for i in Path(graph_folder).glob('*.npy')}
+    _worker_graph = RoutingGraph.from_arrays(arrays)
+
+
+def search_sign_paths(task):
+    start_vertex_id, targets = task
+    return sign_paths(_worker_graph, start_vertex_id, targets)
+
+
+def search_distance_row(task):
+    start_vertex_id, targets, cutoff = task
+    return distance_row(_worker_graph, start_vertex_id, targets, cutoff)
@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+# Repository folder is the plugin package, it is registered as VeloRouteScripts
+# so qgis-free modules can be tested without QGIS
+import importlib.util
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+PACKAGE_NAME = 'VeloRouteScripts'
+PACKAGE_FOLDER = Path(__file__).resolve().parent.parent
+
+if PACKAGE_NAME not in sys.modules:
+    spec = importlib.util.spec_from_file_location(
+        PACKAGE_NAME,
+        PACKAGE_FOLDER / '__init__.py',
+        submodule_search_locations=[str(PACKAGE_FOLDER)],
+        )
+    package = importlib.util.module_from_spec(spec)
+    sys.modules[PACKAGE_NAME] = package
+    spec.loader.exec_module(package)
+
+from VeloRouteScripts.routing import RoutingGraph, EARTH_RADIUS_LOWER_BOUND, spherical_distances
+
+
+def make_graph(vertex_count, seed, neighbour_count=3):
+    # random lon/lat points linked with their nearest neighbours, lengths are spherical
+    rng = np.random.default_rng(seed)
+    coords = np.column_stack([37 + rng.random(vertex_count) * 0.05, 55 + rng.random(vertex_count) * 0.05])
+    edges = set()
+    for i in range(vertex_count):
+        distances = np.hypot(*(coords - coords[i]).T)
+        for j in np.argsort(distances)[1:neighbour_count + 1].tolist():
+            edges.add((min(i, j), max(i, j)))
+    edges = np.array(sorted(edges))
+    elevations = rng.random(vertex_count) * 50
+    # lengths are a bit longer than spherical lower bounds, as ellipsoidal lengths are
+    lengths = spherical_distances(
+        coords[edges[:, 0], 0], coords[edges[:, 0], 1], coords[edges[:, 1], 0], coords[edges[:, 1], 1],
+        EARTH_RADIUS_LOWER_BOUND * 1.01,
+        )
+    deltas = np.abs(elevations[edges[:, 0]] - elevations[edges[:, 1]])
+    edge_costs = np.column_stack([lengths, deltas, np.hypot(lengths, deltas)])
+    return RoutingGraph(coords, edges[:, 0], edges[:, 1], edge_costs, elevations)
+
+
+def all_distances(graph):
+    # Floyd-Warshall over 3d costs as float32 stored in the graph
+    n = graph.vertex_count
+    distances = np.full((n, n), np.inf)
+    np.fill_diagonal(distances, 0)
+    costs = graph.edge_costs[:, 2].astype(np.float64)
+    for a, b, cost in zip(graph.edge_from.tolist(), graph.edge_to.tolist(), costs.tolist()):
+        distances[a, b] = distances[b, a] = min(distances[a, b], cost)
+    for k in range(n):
+        distances = np.minimum(distances, distances[:, k:k + 1] + distances[k:k + 1, :])
+    return distances
+
+
+@pytest.fixture(scope='module')
+def graph():
+    return make_graph(80, seed=1)
+
+
+@pytest.fixture(scope='module')
+def distances(graph):
+    return all_distances(graph)
@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+import pytest
+
+from VeloRouteScripts.contraction import ContractionHierarchy
+
+
+@pytest.fixture(scope='module')
+def contraction_hierarchy(graph):
+    return ContractionHierarchy.build(graph)
+
+
+def test_upward_edges_go_to_higher_ranks(contraction_hierarchy, graph):
+    ranks = contraction_hierarchy.ranks
+    assert sorted(ranks.tolist()) == list(range(graph.vertex_count))
+    for vertex_id in range(graph.vertex_count):
+        start, end = contraction_hierarchy.up_offsets[vertex_id], contraction_hierarchy.up_offsets[vertex_id + 1]
+        assert np.all(ranks[contraction_hierarchy.up_neighbours[start:end]] > ranks[vertex_id])
+
+
+def test_query_matches_brute_force(contraction_hierarchy, graph, distances):
+    restored = ContractionHierarchy.from_arrays(contraction_hierarchy.to_arrays())
+    for start in range(0, graph.vertex_count, 7):
+        for finish in range(2, graph.vertex_count, 5):
+            path, _ = restored.query(start, finish)
+            if np.isinf(distances[start, finish]):
+                assert path is None
+                continue
+            # shortcuts are unpacked into original edges
+            assert path[0] == finish and path[-1] == start
+            assert len(graph.path_slots(path)) == len(path) - 1
+            assert graph.path_lengths(path)[1] == pytest.approx(distances[start, finish], rel=1e-5)
+
+
+def test_query_from_vertex_to_itself(contraction_hierarchy):
+    path, _ = contraction_hierarchy.query(4, 4)
+    assert path == [4]
@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+import pytest
+
+from VeloRouteScripts.distance_manifest import DistanceManifest, DirectionRecord, make_direction_key
+from VeloRouteScripts.routing import edge_keys
+
+COORDS = np.array([[30.0, 60.0], [30.01, 60.0], [30.02, 60.0], [30.03, 60.0]])
+EDGE_FROM = np.array([0, 1, 2])
+EDGE_TO = np.array([1, 2, 3])
+
+
+def load_manifest(folder, coords=COORDS, edge_from=EDGE_FROM, edge_to=EDGE_TO, settings_key='s'):
+    manifest = DistanceManifest(folder, 'signs')
+    loaded = manifest.load(settings_key)
+    manifest.compare_graph(coords, edge_from, edge_to, edge_keys(coords, edge_from, edge_to))
+    return manifest, loaded
+
+
+@pytest.fixture
+def folder(tmp_path):
+    # sign 5 reaches vertex 2 by the first two edges, sign 6 reaches it by the last one
+    manifest, loaded = load_manifest(tmp_path)
+    assert not loaded
+    keys = edge_keys(COORDS, EDGE_FROM, EDGE_TO).tolist()
+    record = DirectionRecord('k1', (30.0, 60.0))
+    record.add_check((30.02, 60.0), 1200.0, set(keys[:2]))
+    record.add_path(1100.0, 1200.0, [(30.0, 60.0), (30.01, 60.0), (30.02, 60.0)])
+    manifest.put(5, '1A', record)
+    record = DirectionRecord('k2', (30.03, 60.0))
+    record.add_check((30.02, 60.0), 600.0, set(keys[2:]))
+    manifest.put(6, '1A', record)
+    manifest.save()
+    return tmp_path
+
+
+def test_round_trip(folder):
+    manifest, loaded = load_manifest(folder)
+    assert loaded
+    record = manifest.get(5, '1A', 'k1')
+    assert record.key == 'k1'
+    (length_2d, length_3d, points), = record.paths
+    assert (length_2d, length_3d) == (1100.0, 1200.0)
+    assert [tuple(i) for i in points] == [(30.0, 60.0), (30.01, 60.0), (30.02, 60.0)]
+    assert manifest.get(6, '1A', 'k2') is not None
+    assert manifest.stats['reused'] == 2
+
+
+def test_changed_inputs_are_not_reused(folder):
+    manifest, _ = load_manifest(folder)
+    assert manifest.get(5, '1A', 'other') is None
+    assert manifest.get(5, '2A', 'k1') is None
+
+
+def test_other_settings_are_not_loaded(folder):
+    _, loaded = load_manifest(folder, settings_key='other')
+    assert not loaded
+
+
+def test_removed_edge_invalidates_only_paths_through_it(folder):
+    coords = np.vstack([COORDS, [[31.0, 61.0], [31.01, 61.0]]])
+    manifest, _ = load_manifest(folder, coords, np.array([0, 1, 4]), np.array([1, 2, 5]))
+    assert len(manifest.removed_keys) == 1
+    assert manifest.get(5, '1A', 'k1') is not None
+    assert manifest.get(6, '1A', 'k2') is None
+
+
+def test_added_edge_near_path_invalidates_it(folder):
+    coords = np.vstack([COORDS, [[30.01, 60.001]]])
+    manifest, _ = load_manifest(folder, coords, np.array([0, 1, 2, 1]), np.array([1, 2, 3, 4]))
+    assert manifest.get(5, '1A', 'k1') is None
+
+
+def run_directions(folder, sign_fields, poi):
+    # two directions of sign 5 as the framework runs them: key before calculation, outputs written after
+    manifest, _ = load_manifest(folder)
+    keys = edge_keys(COORDS, EDGE_FROM, EDGE_TO).tolist()
+    for direction, fields in sign_fields.items():
+        service_names = fields['pic'] if fields['nameru'] is None else None
+        key = make_direction_key((30.0, 60.0), fields['nameru'], service_names, [poi])
+        if manifest.get(5, direction, key) is not None:
+            continue
+        record = DirectionRecord(key, (30.0, 60.0))
+        record.add_check((30.02, 60.0), 1200.0, set(keys[:2]))
+        manifest.put(5, direction, record)
+        if service_names is None:
+            fields['pic'] = poi[4]
+    manifest.save()
+    return manifest
+
+
+def test_second_run_reuses_directions_with_written_pic(tmp_path):
+    poi = ('poi', 1, 30.02, 60.0, 'cafe', 'Cafe')
+    sign_fields = {'1A': {'nameru': 'Кафе', 'pic': None}, '1B': {'nameru': None, 'pic': 'cafe wc'}}
+    first = run_directions(tmp_path, sign_fields, poi)
+    assert first.stats == {'reused': 0, 'computed': 2}
+    assert sign_fields['1A']['pic'] == 'cafe'
+    second = run_directions(tmp_path, sign_fields, poi)
+    assert second.stats['reused'] > 0
+    assert second.stats == {'reused': 2, 'computed': 0}
+
+
+def test_changed_services_of_service_direction_are_recalculated(tmp_path):
+    poi = ('poi', 1, 30.02, 60.0, 'cafe', 'Cafe')
+    run_directions(tmp_path, {'1B': {'nameru': None, 'pic': 'cafe'}}, poi)
+    second = run_directions(tmp_path, {'1B': {'nameru': None, 'pic': 'cafe wc'}}, poi)
+    assert second.stats == {'reused': 0, 'computed': 1}
@@ -0,0 +1,27 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+import pytest
+
+from VeloRouteScripts.routing import distance_row, sign_paths
+
+
+def test_distance_row_matches_brute_force(graph, distances):
+    targets = list(range(1, graph.vertex_count, 5))
+    paths, _ = sign_paths(graph, 0, targets)
+    lengths_2d, lengths_3d = distance_row(graph, 0, targets)
+    for i, finish in enumerate(targets):
+        expected = distances[0, finish]
+        if np.isinf(expected):
+            assert np.isnan(lengths_3d[i])
+        else:
+            assert lengths_3d[i] == pytest.approx(expected, rel=1e-5)
+            assert lengths_2d[i] == pytest.approx(paths[0, finish][1], rel=1e-5)
+
+
+def test_distance_row_cutoff(graph, distances):
+    targets = list(range(graph.vertex_count))
+    cutoff = float(np.median(distances[0][np.isfinite(distances[0])]))
+    _, lengths_3d = distance_row(graph, 0, targets, cutoff)
+    reached = ~np.isnan(lengths_3d)
+    assert np.all(distances[0][reached] <= cutoff * (1 + 1e-6))
+    assert np.all(distances[0][~reached] >= cutoff * (1 - 1e-6))
@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+
+from VeloRouteScripts import routing
+from VeloRouteScripts.routing import GraphCache, RoutingGraph, graph_cache_key
+
+
+def test_round_trip_is_memory_mapped(tmp_path, graph):
+    cache = GraphCache(tmp_path)
+    assert cache.load('tied', 'a') is None
+    folder = cache.save('tied', 'a', graph.to_arrays())
+    arrays = cache.load('tied', 'a')
+    assert folder == cache.entry_folder('tied', 'a')
+    assert isinstance(arrays['neighbours'], np.memmap)
+    restored = RoutingGraph.from_arrays(arrays)
+    assert np.array_equal(restored.neighbours, graph.neighbours)
+
+
+def test_keeps_only_last_entry_of_kind(tmp_path):
+    cache = GraphCache(tmp_path)
+    cache.save('tied', 'a', {'x': np.arange(3)})
+    cache.save('ch', 'a', {'x': np.arange(2)})
+    cache.save('tied', 'b', {'x': np.arange(4)})
+    assert cache.load('tied', 'a') is None
+    assert cache.load('tied', 'b')['x'].tolist() == [0, 1, 2, 3]
+    assert cache.load('ch', 'a') is not None
+    assert sorted(i.name for i in tmp_path.iterdir()) == ['ch_a', 'tied_b']
+
+
+def test_old_entry_survives_failed_save(tmp_path, monkeypatch):
+    cache = GraphCache(tmp_path)
+    cache.save('tied', 'a', {'x': np.arange(3)})
+
+    def fail_replace(src, dst):
+        raise OSError('disk is full')
+
+    monkeypatch.setattr(routing.os, 'replace', fail_replace)
+    assert cache.save('tied', 'b', {'x': np.arange(4)}) is None
+    assert 'disk is full' in cache.error
+    assert cache.load('tied', 'a')['x'].tolist() == [0, 1, 2]
+    assert sorted(i.name for i in tmp_path.iterdir()) == ['tied_a']
+
+
+def test_key_depends_on_every_part():
+    assert graph_cache_key(b'a', b'b') != graph_cache_key(b'ab')
+    assert graph_cache_key(b'a', b'b') == graph_cache_key(b'a', b'b')
+    assert graph_cache_key(b'a', b'b') != graph_cache_key(b'b', b'a')
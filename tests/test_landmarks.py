@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+import pytest
+
+from VeloRouteScripts.routing import Landmarks, astar, bidirectional_astar, spherical_heuristic
+
+
+@pytest.fixture(scope='module')
+def landmarks(graph):
+    return Landmarks.from_arrays(Landmarks.select(graph, 4).to_arrays())
+
+
+def iter_pairs(graph):
+    for start in range(0, graph.vertex_count, 11):
+        for finish in range(3, graph.vertex_count, 7):
+            yield start, finish
+
+
+def test_landmark_bound_is_admissible(graph, distances, landmarks):
+    for start, finish in iter_pairs(graph):
+        if np.isfinite(distances[start, finish]):
+            assert landmarks.heuristic(graph, finish)(start) <= distances[start, finish] * (1 + 1e-5)
+
+
+def test_alt_and_bidirectional_match_brute_force(graph, distances, landmarks):
+    for start, finish in iter_pairs(graph):
+        expected = distances[start, finish]
+        results = [
+            astar(graph, start, finish, landmarks.heuristic(graph, finish))[:2],
+            bidirectional_astar(
+                graph, start, finish,
+                landmarks.heuristic(graph, finish),
+                landmarks.heuristic(graph, start),
+                )[:2],
+            ]
+        for path, slots in results:
+            if np.isinf(expected):
+                assert path is None and slots is None
+            else:
+                assert path[0] == finish and path[-1] == start
+                assert graph.slots_edges(slots) == graph.slots_edges(graph.path_slots(path))
+                assert graph.slots_lengths(slots)[1] == pytest.approx(expected, rel=1e-5)
+
+
+def test_alt_expands_fewer_vertices_than_spherical_bound(graph, landmarks):
+    spherical_expanded = alt_expanded = 0
+    for start, finish in iter_pairs(graph):
+        spherical_expanded += astar(graph, start, finish, spherical_heuristic(graph, finish))[2]
+        alt_expanded += astar(graph, start, finish, landmarks.heuristic(graph, finish))[2]
+    assert alt_expanded <= spherical_expanded
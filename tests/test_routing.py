@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+import pytest
+
+from VeloRouteScripts.routing import (
+    RoutingGraph,
+    PathCache,
+    dijkstra,
+    astar,
+    spherical_heuristic,
+    )
+
+
+def test_csr_lists_every_edge_in_both_directions(graph):
+    assert graph.offsets[0] == 0
+    assert graph.offsets[-1] == 2 * graph.edge_count
+    assert np.all(np.diff(graph.offsets) >= 0)
+    slots = set()
+    for vertex_id in range(graph.vertex_count):
+        for slot in range(graph.offsets[vertex_id], graph.offsets[vertex_id + 1]):
+            edge_id = graph.slot_edges[slot]
+            ends = {int(graph.edge_from[edge_id]), int(graph.edge_to[edge_id])}
+            assert ends == {vertex_id, int(graph.neighbours[slot])}
+            assert graph.slot_costs[slot] == graph.edge_costs[edge_id, 2]
+            slots.add((vertex_id, int(graph.neighbours[slot])))
+    for a, b in zip(graph.edge_from.tolist(), graph.edge_to.tolist()):
+        assert (a, b) in slots and (b, a) in slots
+
+
+def test_csr_survives_arrays_round_trip(graph):
+    restored = RoutingGraph.from_arrays(graph.to_arrays())
+    for name in RoutingGraph.ARRAY_NAMES:
+        assert np.array_equal(getattr(restored, name), getattr(graph, name))
+
+
+def test_dijkstra_matches_brute_force(graph, distances):
+    for start in range(0, graph.vertex_count, 9):
+        tree = dijkstra(graph, start)
+        for finish in range(graph.vertex_count):
+            if np.isinf(distances[start, finish]):
+                assert tree.path_to(finish) is None
+                continue
+            assert tree.distance_to(finish) == pytest.approx(distances[start, finish], rel=1e-6)
+            path, slots = tree.path_with_slots(finish)
+            assert path[0] == finish and path[-1] == start
+            # every slot goes to the previous path vertex from the next one
+            sources = graph.slot_sources()
+            assert [(sources[i], int(graph.neighbours[i])) for i in slots] == list(zip(path[1:], path))
+            assert graph.slots_lengths(slots)[1] == pytest.approx(distances[start, finish], rel=1e-5)
+            assert graph.path_lengths(path)[1] == pytest.approx(distances[start, finish], rel=1e-5)
+
+
+def test_astar_matches_brute_force(graph, distances):
+    for start in range(0, graph.vertex_count, 11):
+        for finish in range(3, graph.vertex_count, 7):
+            path, slots, expanded = astar(graph, start, finish, spherical_heuristic(graph, finish))
+            if np.isinf(distances[start, finish]):
+                assert path is None
+                continue
+            assert path[0] == finish and path[-1] == start
+            assert len(slots) == len(path) - 1
+            assert graph.slots_lengths(slots)[1] == pytest.approx(distances[start, finish], rel=1e-5)
+            assert expanded <= graph.vertex_count
+
+
+def test_path_tree_rejects_vertex_missing_on_graph(graph):
+    tree = dijkstra(graph, 0)
+    with pytest.raises(Exception):
+        tree.path_to(-1)
+    with pytest.raises(Exception):
+        tree.distance_to(graph.vertex_count)
+
+
+def test_path_cache_symmetric_returns_reversed_path():
+    cache = PathCache(10, symmetric=True)
+    cache.put(1, 2, [2, 5, 1], 10.0, 11.0, [7, 3])
+    assert cache.get(2, 1) == ([1, 5, 2], 10.0, 11.0, [3, 7])
+    assert cache.get(2, 1) == ([1, 5, 2], 10.0, 11.0, [3, 7])
+    assert (cache.hits, cache.misses) == (2, 0)
+
+
+def test_path_cache_not_symmetric_misses_reversed_pair():
+    cache = PathCache(10, symmetric=False)
+    cache.put(1, 2, [2, 5, 1], 10.0, 11.0, [7, 3])
+    assert cache.get(2, 1) is None
+    assert cache.get(1, 2) == ([2, 5, 1], 10.0, 11.0, [7, 3])
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_path_cache_evicts_least_recently_used():
+    cache = PathCache(2)
+    cache.put(1, 2, [2, 1], 1.0, 1.0, [0])
+    cache.put(1, 3, [3, 1], 1.0, 1.0, [0])
+    cache.get(1, 2)
+    cache.put(1, 4, [4, 1], 1.0, 1.0, [0])
+    assert cache.get(1, 3) is None
+    assert cache.get(1, 2) is not None
+    assert PathCache(0).put(1, 2, [2, 1], 1.0, 1.0, [0]) == ([2, 1], 1.0, 1.0, [0])
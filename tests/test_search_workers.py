@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+import pytest
+
+from VeloRouteScripts import routing
+from VeloRouteScripts.routing import GraphCache, sign_paths, distance_row
+
+
+@pytest.fixture
+def graph_folder(tmp_path, graph):
+    return GraphCache(tmp_path / 'cache').save('tied', 'tmp', graph.to_arrays())
+
+
+def make_tasks(graph):
+    targets = list(range(2, graph.vertex_count, 6))
+    return [(start, targets) for start in range(0, graph.vertex_count, 13)]
+
+
+def test_worker_functions_match_in_process_search(graph, graph_folder):
+    routing.init_search_worker(str(graph_folder))
+    try:
+        for start, targets in make_tasks(graph):
+            assert routing.search_sign_paths((start, targets)) == sign_paths(graph, start, targets)
+            expected = distance_row(graph, start, targets, 500.0)
+            result = routing.search_distance_row((start, targets, 500.0))
+            np.testing.assert_array_equal(result[1], expected[1])
+    finally:
+        routing._worker_graph = None
+
@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+import pytest
+
+from VeloRouteScripts.routing import SegmentGrid
+
+
+@pytest.mark.parametrize('scale', [0.01, 1, 50])
+def test_nearest_matches_brute_force(scale):
+    rng = np.random.default_rng(3)
+    vertex_count, edge_count = 120, 200
+    coords = rng.random((vertex_count, 2)) * scale
+    edge_from = rng.integers(0, vertex_count, edge_count)
+    edge_to = rng.integers(0, vertex_count, edge_count)
+    grid = SegmentGrid(coords, edge_from, edge_to)
+    # points outside of the grid too
+    points = (rng.random((150, 2)) * 1.4 - 0.2) * scale
+    edge_ids, ts, result_distances = grid.nearest(points[:, 0].tolist(), points[:, 1].tolist())
+    for i, (x, y) in enumerate(points.tolist()):
+        all_distances, all_ts = grid.project(np.arange(edge_count), x, y)
+        assert result_distances[i] == pytest.approx(all_distances.min(), abs=1e-12)
+        assert all_distances[edge_ids[i]] == pytest.approx(all_distances.min(), abs=1e-12)
+        assert ts[i] == pytest.approx(all_ts[edge_ids[i]])
+
+
+def test_projection_position_on_edge():
+    grid = SegmentGrid(np.array([[0.0, 0.0], [10.0, 0.0]]), np.array([0]), np.array([1]))
+    edge_ids, ts, result_distances = grid.nearest([2.5, -3.0, 14.0], [1.0, 4.0, 3.0])
+    assert edge_ids.tolist() == [0, 0, 0]
+    assert ts.tolist() == pytest.approx([0.25, 0.0, 1.0])
+    assert result_distances.tolist() == pytest.approx([1.0, 5.0, 5.0])
+
+
+def test_grid_without_edges():
+    grid = SegmentGrid(np.zeros((0, 2)), np.array([], dtype=int), np.array([], dtype=int))
+    edge_ids, _, result_distances = grid.nearest([1.0], [1.0])
+    assert edge_ids.tolist() == [-1]
+    assert np.isinf(result_distances[0])
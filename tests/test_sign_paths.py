@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+import pytest
+
+from VeloRouteScripts.routing import dijkstra, sign_paths
+
+
+def test_sign_paths_match_brute_force(graph, distances):
+    targets = list(range(1, graph.vertex_count, 5))
+    paths, expanded = sign_paths(graph, 0, targets)
+    assert 0 < expanded <= graph.vertex_count
+    for finish in targets:
+        expected = distances[0, finish]
+        if np.isinf(expected):
+            assert (0, finish) not in paths
+            continue
+        vertex_ids, l2d, l3d, edge_ids = paths[0, finish]
+        assert vertex_ids[0] == finish and vertex_ids[-1] == 0
+        assert edge_ids == graph.slots_edges(graph.path_slots(vertex_ids))
+        assert (l2d, l3d) == graph.path_lengths(vertex_ids)
+        assert l3d == pytest.approx(expected, rel=1e-5)
+
+
+def test_dijkstra_stops_after_targets_are_settled(graph, distances):
+    full = dijkstra(graph, 0)
+    targets = [5, 17]
+    tree = dijkstra(graph, 0, targets)
+    assert tree.expanded <= full.expanded
+    for finish in targets:
+        assert tree.distance_to(finish) == pytest.approx(distances[0, finish], rel=1e-6)
+
+
+def test_sign_standing_on_target_gets_one_vertex_path(graph):
+    vertex_ids, l2d, l3d, edge_ids = sign_paths(graph, 3, [3])[0][3, 3]
+    assert vertex_ids == [3] and edge_ids == []
+    assert (l2d, l3d) == (0, 0)
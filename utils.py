@@ -6,11 +6,20 @@ from qgis.core import (
     QgsCoordinateReferenceSystem,
     QgsCoordinateTransform,
     QgsFeatureRequest,
-    QgsSpatialIndex
+    QgsFeatureSink,
+    QgsPointXY,
+    QgsSpatialIndex,
+    QgsDistanceArea,
+    QgsLineString,
     )
 import re
+import sys
+import numpy as np
+import shutil
 from pathlib import Path
 import logging
+from math import hypot
+from .routing import GraphCache, graph_cache_key
 
 class FeedbackLogger:
     def __init__(self, name, feedback=None):
@@ -69,8 +78,54 @@ def draw_line(crs, *geometries):
     provider.addFeatures(features)
     QgsProject.instance().addMapLayer(layer)
     
+### COORDINATE TRANSFORMS ###
+
+# shared by all modules during one algorithm run, PROJ pipeline is created once per crs pair
+_transforms = {}
+# layer points reprojected in bulk, valid during one algorithm run
+_layer_points = {}
+
+def crs_key(crs):
+    return crs.authid() or crs.toWkt()
+
+def get_transform(source_crs, target_crs):
+    key = (crs_key(source_crs), crs_key(target_crs))
+    if key not in _transforms:
+        _transforms[key] = QgsCoordinateTransform(source_crs, target_crs, QgsProject.instance())
+    return _transforms[key]
+
+def transform_coords(coords, source_crs, target_crs):
+    # (n, 2) array of coordinates transformed in one call, points are carried by a linestring
+    coords = np.asarray(coords, dtype=np.float64).reshape(-1, 2)
+    if len(coords) == 0 or crs_key(source_crs) == crs_key(target_crs):
+        return coords
+    line = QgsLineString(coords[:, 0].tolist(), coords[:, 1].tolist())
+    line.transform(get_transform(source_crs, target_crs))
+    # wkb: byte order, geometry type, point count and xy doubles
+    wkb = bytes(line.asWkb())
+    dtype = '<f8' if wkb[0] == 1 else '>f8'
+    return np.frombuffer(wkb, dtype=dtype, offset=9).reshape(-1, 2).astype(np.float64)
+
+def get_layer_points(layer, target_crs):
+    # {feature id: QgsPointXY in target_crs} for all features of a point layer
+    key = (layer.id(), crs_key(target_crs))
+    if key not in _layer_points:
+        xform = get_transform(layer.sourceCrs(), target_crs)
+        request = QgsFeatureRequest().setNoAttributes()
+        points = {}
+        for feature in layer.getFeatures(request):
+            if feature.hasGeometry():
+                points[feature.id()] = xform.transform(feature.geometry().asPoint())
+        _layer_points[key] = points
+    return _layer_points[key]
+
+def reset_caches():
+    # layers could be edited and project transform context changed between runs
+    _layer_points.clear()
+    _transforms.clear()
+
 def xform_geometry(geometry, source_crs, target_crs):
-        xform = QgsCoordinateTransform(source_crs, target_crs, QgsProject.instance())
+        xform = get_transform(source_crs, target_crs)
         geometry.transform(xform)
         return geometry
     
@@ -96,6 +151,22 @@ def get_main_road_layer():
     
 def save_project():
     return QgsProject.instance().write()
+
+def get_python_executable():
+    # inside QGIS sys.executable is the qgis binary, child processes need the python interpreter
+    executable = Path(sys.executable)
+    if executable.name.lower().startswith('python'):
+        return str(executable)
+    candidates = [
+        Path(sys.exec_prefix, 'python.exe'),
+        Path(sys.exec_prefix, 'python3.exe'),
+        Path(sys.exec_prefix, 'bin', 'python3'),
+        Path(sys.exec_prefix, 'bin', 'python'),
+        ]
+    for candidate in candidates:
+        if candidate.exists():
+            return str(candidate)
+    return shutil.which('python3') or shutil.which('python') or str(executable)
         
 
 class FeedbackImitator:
@@ -111,6 +182,100 @@ class FeedbackImitator:
     def isCanceled(self):
         raise KeyboardInterrupt()
 
+
+class BulkAttributeWriter:
+    # collects {fid: {field index: value}} and writes them by one call on commit,
+    # so a failed run leaves the layer untouched
+    def __init__(self, layer):
+        self.layer = layer
+        self.provider = layer.dataProvider()
+        self.field_indexes = {}
+        self.changes = {}
+        self.changed_count = 0
+        
+    def field_index(self, field_name):
+        if field_name not in self.field_indexes:
+            index = self.layer.fields().lookupField(field_name)
+            if index == -1:
+                raise Exception(f'Cant find attribute {field_name} in layer {self.layer.name()}')
+            self.field_indexes[field_name] = index
+        return self.field_indexes[field_name]
+    
+    def set(self, feature, field_name, value):
+        index = self.field_index(field_name)
+        if feature.attribute(index) == value:
+            return
+        # keep feature in sync, callers read values they have written
+        feature.setAttribute(index, value)
+        self.changes.setdefault(feature.id(), {})[index] = value
+        self.changed_count += 1
+            
+    def flush(self):
+        if not self.changes:
+            return
+        if self.layer.isEditable():
+            # layer is in user edit session - go through edit buffer as one undo command
+            self.layer.beginEditCommand('Bulk attribute change')
+            try:
+                for fid, attributes in self.changes.items():
+                    self.layer.changeAttributeValues(fid, attributes)
+            except Exception:
+                self.layer.destroyEditCommand()
+                raise
+            self.layer.endEditCommand()
+        elif not self.provider.changeAttributeValues(self.changes):
+            # provider applies the whole dict in one transaction
+            raise Exception(f'Cant change attributes in layer {self.layer.name()}: {self.provider.errors()}')
+        self.changes = {}
+        
+    def commit(self):
+        self.flush()
+        if not self.layer.isEditable():
+            self.layer.reload()
+        self.layer.triggerRepaint()
+
+
+class ChunkedSinkWriter:
+    # buffers features into chunks and writes them with one addFeatures call per chunk;
+    # sinks are not thread-safe, so writing stays in the thread of the algorithm
+    def __init__(self, sink, chunk_size=1000, precision=None, id_field='id'):
+        self.sink = sink
+        self.chunk_size = max(1, chunk_size)
+        self.precision = precision
+        self.id_field = id_field
+        self.buffer = []
+        self.count = 0
+                
+    def add(self, feature):
+        if self.id_field is not None:
+            feature[self.id_field] = self.count
+        if self.precision is not None:
+            feature.setGeometry(self.reduce_precision(feature.geometry()))
+        self.count += 1
+        self.buffer.append(feature)
+        if len(self.buffer) >= self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        chunk, self.buffer = self.buffer, []
+        if chunk and not self.sink.addFeatures(chunk, QgsFeatureSink.FastInsert):
+            raise Exception(f'Cant add features to sink: {self.sink.lastError()}')
+            
+    def reduce_precision(self, geometry):
+        # round coordinates and drop vertices which became duplicates
+        points = []
+        for pt in geometry.asPolyline():
+            pt = QgsPointXY(round(pt.x(), self.precision), round(pt.y(), self.precision))
+            if not points or pt != points[-1]:
+                points.append(pt)
+        if len(points) < 2:
+            return geometry
+        return QgsGeometry.fromPolylineXY(points)
+            
+    def close(self):
+        self.flush()
+        return self.count
+
         
 class PackedFeature:
     def __init__(self, feature, layer):
@@ -118,10 +283,10 @@ class PackedFeature:
         self.layer = layer
         
     def get_transformed_geometry(self, target_crs):
-        geometry = self.feature.geometry()
-        xform = QgsCoordinateTransform(self.layer.sourceCrs(), target_crs, QgsProject.instance())
-        geometry.transform(xform)
-        return geometry
+        return QgsGeometry.fromPointXY(self.get_transformed_point(target_crs))
+    
+    def get_transformed_point(self, target_crs):
+        return get_layer_points(self.layer, target_crs)[self.feature.id()]
     
     def get_4326_geometry(self):
         return self.get_transformed_geometry(QgsCoordinateReferenceSystem("EPSG:4326"))
@@ -129,22 +294,308 @@ class PackedFeature:
     @classmethod
     def from_layer(cls, layer):
         return [cls(i, layer) for i in layer.getFeatures()]
+
+
+class PointStore:
+    # struct of arrays for point features of several layers,
+    # full features (with attributes) are fetched by one request per layer on first PointRecord.feature
+    def __init__(self, layers):
+        self.layers = list(layers)
+        self.features = {}
+        crs_4326 = QgsCoordinateReferenceSystem("EPSG:4326")
+        layer_indexes, fids, xs, ys, xs_4326, ys_4326 = [], [], [], [], [], []
+        request = QgsFeatureRequest().setNoAttributes()
+        for layer_index, layer in enumerate(self.layers):
+            xform = get_transform(layer.sourceCrs(), crs_4326)
+            for feature in layer.getFeatures(request):
+                if not feature.hasGeometry():
+                    continue
+                pt = feature.geometry().asPoint()
+                pt_4326 = xform.transform(pt)
+                layer_indexes.append(layer_index)
+                fids.append(feature.id())
+                xs.append(pt.x())
+                ys.append(pt.y())
+                xs_4326.append(pt_4326.x())
+                ys_4326.append(pt_4326.y())
+        self.layer_indexes = np.array(layer_indexes, dtype=np.int32)
+        self.fids = np.array(fids, dtype=np.int64)
+        self.xs = np.array(xs, dtype=np.float64)
+        self.ys = np.array(ys, dtype=np.float64)
+        self.xs_4326 = np.array(xs_4326, dtype=np.float64)
+        self.ys_4326 = np.array(ys_4326, dtype=np.float64)
+        # filled by grouping/sorting along roads
+        self.road_ids = np.full(len(fids), -1, dtype=np.int64)
+        self.chainages = np.full(len(fids), np.nan, dtype=np.float64)
+        
+    def __len__(self):
+        return len(self.fids)
+    
+    def record(self, index):
+        return PointRecord(self, int(index))
+    
+    def layer(self, index):
+        return self.layers[self.layer_indexes[index]]
+    
+    def get_feature(self, index):
+        layer_index = int(self.layer_indexes[index])
+        layer = self.layers[layer_index]
+        if layer_index not in self.features:
+            request = QgsFeatureRequest().setFilterFids(self.fids[self.layer_indexes == layer_index].tolist())
+            self.features[layer_index] = {feature.id(): feature for feature in layer.getFeatures(request)}
+        fid = int(self.fids[index])
+        feature = self.features[layer_index].get(fid)
+        if feature is None:
+            raise Exception(f'Cant find feature {fid} in layer {layer.name()}')
+        return feature
+    
+    def get_point(self, index, target_crs):
+        layer = self.layer(index)
+        if target_crs == layer.sourceCrs():
+            return QgsPointXY(self.xs[index], self.ys[index])
+        if crs_key(target_crs) == 'EPSG:4326':
+            return QgsPointXY(self.xs_4326[index], self.ys_4326[index])
+        return get_transform(layer.sourceCrs(), target_crs).transform(QgsPointXY(self.xs[index], self.ys[index]))
+    
+    def get_points(self, target_crs):
+        # [QgsPointXY in target_crs] for all points, transforms are done once per layer
+        points = [None] * len(self)
+        for layer_index, layer in enumerate(self.layers):
+            indexes = np.flatnonzero(self.layer_indexes == layer_index).tolist()
+            xform = None if target_crs == layer.sourceCrs() else get_transform(layer.sourceCrs(), target_crs)
+            for i in indexes:
+                pt = QgsPointXY(self.xs[i], self.ys[i])
+                points[i] = pt if xform is None else xform.transform(pt)
+        return points
+
+
+class PointRecord:
+    # view on one PointStore row, compatible with PackedFeature
+    __slots__ = ('store', 'index', '_feature')
+    
+    def __init__(self, store, index):
+        self.store = store
+        self.index = index
+        self._feature = None
+        
+    @property
+    def layer(self):
+        return self.store.layer(self.index)
+    
+    @property
+    def feature_id(self):
+        return int(self.store.fids[self.index])
+    
+    @property
+    def feature(self):
+        if self._feature is None:
+            self._feature = self.store.get_feature(self.index)
+        return self._feature
+    
+    def get_transformed_point(self, target_crs):
+        return self.store.get_point(self.index, target_crs)
+    
+    def get_transformed_geometry(self, target_crs):
+        return QgsGeometry.fromPointXY(self.get_transformed_point(target_crs))
+    
+    def get_4326_geometry(self):
+        return self.get_transformed_geometry(QgsCoordinateReferenceSystem("EPSG:4326"))
         
 ### POINTS SORTING ###
 
-def grouping_points(road_layer, pt_packed_features):
-    spatial = QgsSpatialIndex(road_layer.getFeatures())
-    groups = {}
-    for pt_f in pt_packed_features:
-        neighbor = spatial.nearestNeighbor(pt_f.get_transformed_geometry(road_layer.sourceCrs()).asPoint(), 1)[0]
-        group = groups.get(neighbor, [])
-        group.append(pt_f)
-        groups[neighbor] = group
-    return groups
+class RoadIndex:
+    # road features fetched once: spatial index for grouping and flat segment arrays
+    # for vectorized linear referencing (same measure as QgsGeometry.lineLocatePoint)
+    MAX_MATRIX_SIZE = 2000000
+    
+    def __init__(self, road_layer):
+        self.layer = road_layer
+        self.crs = road_layer.sourceCrs()
+        self.features = {feature.id(): feature for feature in road_layer.getFeatures()}
+        if not self.features:
+            raise Exception(f'Layer {road_layer.name()} has no roads')
+        self.spatial = QgsSpatialIndex(iter(self.features.values()))
+        self.segments = {fid: self.get_segments(feature.geometry()) for fid, feature in self.features.items()}
+        self.distance_area = QgsDistanceArea()
+        self.distance_area.setSourceCrs(self.crs, QgsProject.instance().transformContext())
+        self.distance_area.setEllipsoid('WGS84')
+        self.metric_measures = {}
+        
+    def get_segments(self, geometry):
+        # (x0, y0, x1, y1, measure at segment start) for all parts one after another
+        parts = geometry.asMultiPolyline() if geometry.isMultipart() else [geometry.asPolyline()]
+        rows = []
+        measure = 0.0
+        for part in parts:
+            for a, b in zip(part, part[1:]):
+                rows.append((a.x(), a.y(), b.x(), b.y(), measure))
+                measure += hypot(b.x() - a.x(), b.y() - a.y())
+        return np.array(rows, dtype=np.float64).reshape(-1, 5)
+    
+    def packed_feature(self, road_id):
+        return PackedFeature(self.features[road_id], self.layer)
+    
+    def cache_parts(self):
+        parts = [self.crs.toWkt().encode()]
+        for fid, feature in self.features.items():
+            parts.append(str(fid).encode())
+            parts.append(bytes(feature.geometry().asWkb()))
+        return parts
+    
+    def route_chainages(self, road_ids, chainages):
+        # position along all roads in iteration order in meters, every road is measured in its direction of travel
+        offsets = {}
+        offset = 0.0
+        for road_id in sorted(self.features, key=self.sort_key):
+            offsets[road_id] = offset
+            offset += self.get_metric_measures(road_id)[-1]
+        result = np.zeros(len(chainages), dtype=np.float64)
+        for road_id in np.unique(road_ids).tolist():
+            indexes = np.flatnonzero(road_ids == road_id)
+            result[indexes] = self.to_meters(road_id, np.asarray(chainages, dtype=np.float64)[indexes])
+            if self.is_reversed(road_id):
+                result[indexes] = self.get_metric_measures(road_id)[-1] - result[indexes]
+            result[indexes] += offsets[road_id]
+        return result
+
+    def get_metric_measures(self, road_id):
+        # ellipsoidal length from the road start to every segment end, starting with 0
+        if road_id not in self.metric_measures:
+            lengths = [
+                self.distance_area.measureLine(QgsPointXY(x0, y0), QgsPointXY(x1, y1))
+                for x0, y0, x1, y1, _ in self.segments[road_id].tolist()
+                ]
+            self.metric_measures[road_id] = np.concatenate(([0.0], np.cumsum(lengths)))
+        return self.metric_measures[road_id]
+
+    def to_meters(self, road_id, chainages):
+        # measures in layer units are converted segment by segment, so geographic crs is handled too
+        segments = self.segments[road_id]
+        if not len(segments):
+            return np.zeros(len(chainages), dtype=np.float64)
+        metric_measures = self.get_metric_measures(road_id)
+        starts = segments[:, 4]
+        lengths = np.hypot(segments[:, 2] - segments[:, 0], segments[:, 3] - segments[:, 1])
+        k = np.clip(np.searchsorted(starts, chainages, side='right') - 1, 0, len(segments) - 1)
+        fractions = np.clip((chainages - starts[k]) / np.where(lengths[k] > 0, lengths[k], 1), 0, 1)
+        return metric_measures[k] + fractions * (metric_measures[k + 1] - metric_measures[k])
+    
+    def nearest_road(self, pt):
+        return self.spatial.nearestNeighbor(pt, 1)[0]
+    
+    def sort_key(self, road_id):
+        # roads are ordered by centroids, from east to west and from south to north
+        pt = self.features[road_id].geometry().centroid().asPoint()
+        return -pt.x(), pt.y()
+    
+    def is_reversed(self, road_id):
+        return is_road_feature_reversed(self.packed_feature(road_id))
+    
+    def locate_points(self, road_id, xs, ys):
+        # distance along the road to the closest point of the road for every (x, y)
+        segments = self.segments[road_id]
+        result = np.zeros(len(xs), dtype=np.float64)
+        if not len(segments):
+            return result
+        x0, y0, x1, y1, measures = (segments[:, i] for i in range(5))
+        dx = x1 - x0
+        dy = y1 - y0
+        lengths_sq = dx * dx + dy * dy
+        safe_lengths_sq = np.where(lengths_sq > 0, lengths_sq, 1)
+        step = max(1, self.MAX_MATRIX_SIZE // len(segments))
+        for i in range(0, len(xs), step):
+            px = np.asarray(xs[i:i + step], dtype=np.float64)[:, None]
+            py = np.asarray(ys[i:i + step], dtype=np.float64)[:, None]
+            t = np.clip(((px - x0) * dx + (py - y0) * dy) / safe_lengths_sq, 0, 1)
+            t[:, lengths_sq == 0] = 0
+            dist_sq = (x0 + t * dx - px) ** 2 + (y0 + t * dy - py) ** 2
+            closest = np.argmin(dist_sq, axis=1)
+            rows = np.arange(len(closest))
+            result[i:i + step] = measures[closest] + t[rows, closest] * np.sqrt(lengths_sq[closest])
+        return result
 
-def get_centroid_coords(packed_feature):
-        pt = packed_feature.feature.geometry().centroid()
-        return -pt.asPoint().x(), pt.asPoint().y()
+
+class RoadOrder:
+    # order of points along roads: (road id, chainage, point index) for every point of PointStore,
+    # stored in project cache and reused until roads or points are changed
+    CACHE_VERSION = b'1'
+    
+    def __init__(self, road_index, point_store, cache=None, feedback=None):
+        self.road_index = road_index
+        self.point_store = point_store
+        self.cache = cache
+        self.logger = FeedbackLogger(__name__, feedback)
+        self.point_indexes = None
+        
+    def cache_kind(self):
+        # every layer set has its own entry, so tools do not evict each other
+        layer_ids = [self.road_index.layer.id()] + [i.id() for i in self.point_store.layers]
+        return 'order_' + graph_cache_key(*[i.encode() for i in layer_ids])[:8]
+    
+    def cache_key(self):
+        store = self.point_store
+        parts = [self.CACHE_VERSION] + self.road_index.cache_parts()
+        parts += [store.layer_indexes.tobytes(), store.fids.tobytes(), store.xs.tobytes(), store.ys.tobytes()]
+        return graph_cache_key(*parts)
+    
+    def load(self):
+        if self.cache is None:
+            return False
+        arrays = self.cache.load(self.cache_kind(), self.cache_key())
+        if arrays is None:
+            return False
+        self.point_store.road_ids[:] = arrays['road_ids']
+        self.point_store.chainages[:] = arrays['chainages']
+        self.point_indexes = np.array(arrays['point_indexes'])
+        return True
+    
+    def save(self):
+        if self.cache is None:
+            return
+        arrays = {
+            'road_ids': self.point_store.road_ids,
+            'chainages': self.point_store.chainages,
+            'point_indexes': self.point_indexes,
+            }
+        if self.cache.save(self.cache_kind(), self.cache_key(), arrays) is None:
+            self.logger.log_error(f'[IterAlongRoad] Points order not saved: {self.cache.error}')
+        
+    def compute(self):
+        store = self.point_store
+        road_crs = self.road_index.crs
+        points = store.get_points(road_crs)
+        # grouping by closest road
+        for i, pt in enumerate(points):
+            store.road_ids[i] = self.road_index.nearest_road(pt)
+        xs = np.array([pt.x() for pt in points], dtype=np.float64)
+        ys = np.array([pt.y() for pt in points], dtype=np.float64)
+        road_ids = np.unique(store.road_ids)
+        # sorting roads by centoids
+        road_ranks = np.zeros(len(store), dtype=np.int64)
+        signed_chainages = np.zeros(len(store), dtype=np.float64)
+        for rank, road_id in enumerate(sorted(road_ids.tolist(), key=self.road_index.sort_key)):
+            indexes = np.flatnonzero(store.road_ids == road_id)
+            store.chainages[indexes] = self.road_index.locate_points(road_id, xs[indexes], ys[indexes])
+            road_ranks[indexes] = rank
+            sign = -1 if self.road_index.is_reversed(road_id) else 1
+            signed_chainages[indexes] = sign * store.chainages[indexes]
+        # lexsort is stable - points with equal chainage keep layer order
+        self.point_indexes = np.lexsort((signed_chainages, road_ranks))
+        
+    def run(self):
+        if self.load():
+            self.logger.log_info('[IterAlongRoad] Points order loaded from cache')
+        else:
+            self.logger.log_info('[IterAlongRoad] Grouping and sorting points')
+            self.compute()
+            self.save()
+        return self.point_indexes
+
+    
+def get_project_cache():
+    home_path = QgsProject.instance().homePath()
+    if home_path:
+        return GraphCache(Path(home_path, '.velo_cache'))
 
 def is_road_feature_reversed(road_packed_feature):
     start_pt = road_packed_feature.feature.geometry().asMultiPolyline()[0][0]
@@ -152,36 +603,23 @@ def is_road_feature_reversed(road_packed_feature):
     diff = end_pt - start_pt
     return diff.y() < 0 and diff.x() > 0
 
-def sort_grouped_points(road_packed_feature, pt_packed_features):
-    reversed = is_road_feature_reversed(road_packed_feature)
-    return sorted(
-        pt_packed_features,
-        key=lambda x: road_packed_feature.feature.geometry().lineLocatePoint(x.get_transformed_geometry(road_packed_feature.layer.sourceCrs())),
-        reverse=reversed
-        )
-
-def iter_points_along_road(road_layer, pt_layers, feedback):
+def iter_points_along_road(road_layer, pt_layers, feedback, cache=None):
     logger = FeedbackLogger(__name__, feedback)
-    road_packed_feature_from_id = lambda x: PackedFeature(next(road_layer.getFeatures(QgsFeatureRequest(x))), road_layer)
-    pt_packed_features = []
-    for l in pt_layers:
-        pt_packed_features += PackedFeature.from_layer(l)
-    # grouping by closest road
-    logger.log_info('[IterAlongRoad] Grouping points')
-    grouping_result = grouping_points(road_layer, pt_packed_features)
-    # sorting roads by centoids
-    logger.log_info('[IterAlongRoad] Sorting roads')
-    sorted_grouping_keys = sorted(
-        grouping_result.keys(), 
-        key=lambda x: get_centroid_coords(road_packed_feature_from_id(x)))
-    # iter sorted roads
-    for road_id in sorted_grouping_keys:
-        pt_group = grouping_result[road_id]
-        road_packed_feature = road_packed_feature_from_id(road_id)
-        # sort points linked to road
-        pt_group_sorted = sort_grouped_points(road_packed_feature, pt_group)
-        for i, pt_packed_feature in enumerate(pt_group_sorted):
-            logger.log_info(f'[IterAlongRoad] Yield points {i+1}/{len(pt_group_sorted)} (road {road_id})')
-            yield road_packed_feature, pt_packed_feature
+    road_index = RoadIndex(road_layer)
+    point_store = PointStore(pt_layers)
+    point_indexes = RoadOrder(road_index, point_store, cache, feedback).run()
+    logger.log_info(f'[IterAlongRoad] {len(point_indexes)} points along {len(np.unique(point_store.road_ids))} roads')
     del logger
-    
\ No newline at end of file
+    yield from iter_ordered_points(road_index, point_store, point_indexes, feedback)
+
+def iter_ordered_points(road_index, point_store, point_indexes, feedback=None):
+    # (road PackedFeature, PointRecord) for points of computed RoadOrder
+    road_packed_feature = None
+    for i, index in enumerate(point_indexes.tolist()):
+        road_id = int(point_store.road_ids[index])
+        if road_packed_feature is None or road_packed_feature.feature.id() != road_id:
+            road_packed_feature = road_index.packed_feature(road_id)
+            if feedback is not None:
+                feedback.setProgress(int(i / len(point_indexes) * 100))
+        yield road_packed_feature, point_store.record(index)
+    
@@ -2,6 +2,7 @@
 
 from qgis.core import QgsProcessingProvider
 from .distance_calculate_algorithm import DistanceCalculateAlgorithm
+from .distance_matrix_algorithm import DistanceMatrixAlgorithm
 from .pages_generator_algorithm import (
     PagesGeneratorAlgorithm, 
     PagesExporterAlgorithm,
@@ -28,6 +29,7 @@ class VeloRouteProvider(QgsProcessingProvider):
         Loads all algorithms belonging to this provider.
         """
         self.addAlgorithm(DistanceCalculateAlgorithm())
+        self.addAlgorithm(DistanceMatrixAlgorithm())
         self.addAlgorithm(PagesGeneratorAlgorithm())
         self.addAlgorithm(PagesExporterAlgorithm())
         self.addAlgorithm(CsvExportAlgorithm())